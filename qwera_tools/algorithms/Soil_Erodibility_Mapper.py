@@ -22,18 +22,98 @@ from qgis.core import (
     QgsProcessingFeedback,
     QgsProcessingException,
     QgsCoordinateReferenceSystem,
+    QgsCoordinateTransform,
     QgsRasterLayer,
     QgsVectorLayer,
     QgsProcessingParameterFile,
     QgsApplication,
+    QgsFeatureRequest,
     QgsProcessing
 )
 from qgis import processing
 from qgis.PyQt.QtCore import QVariant
-from qgis.core import QgsVectorLayer, QgsField, edit
+from qgis.core import QgsVectorLayer, QgsField
 import os
+from osgeo import gdal
+import numpy as np
 from .geom_validity import check_and_fix_validity
 
+# SOM reclass for the field calculator; comparisons evaluate to 0/1 in QGIS expressions
+_SOM_CLASS_FORMULA = '1 + ("{fld}" >= 1) + ("{fld}" > 15) + ("{fld}" >= 30)'
+
+# Erodibility lookup (DIN 19706): rows = soil class 0–6, columns = SOM class 0–4
+_ERODIBILITY_NODATA = -9999.0
+_ERODIBILITY_LUT = np.full((7, 5), _ERODIBILITY_NODATA, dtype=np.float32)
+_ERODIBILITY_LUT[1:, 1] = (1, 2, 3, 4, 5, 5)
+_ERODIBILITY_LUT[1:, 2] = (0, 1, 2, 3, 4, 5)
+_ERODIBILITY_LUT[1:, 3] = (1, 2, 3, 4, 5, 5)
+_ERODIBILITY_LUT[:, 4] = 5  # SOM class 4 always yields class 5
+
+
+def _class_index(arr, n_max, nodata):
+    """Returns (int index array, valid mask) for class rasters with values 0..n_max."""
+    idx = np.zeros(arr.shape, dtype=np.intp)
+    valid = (arr >= 0) & (arr <= n_max) & (arr == np.floor(arr))
+    if nodata is not None:
+        valid &= (arr != nodata)
+    idx[valid] = arr[valid]
+    return idx, valid
+
+
+def _combine_erodibility(soil_path, som_path, out_path, feedback=None):
+    """Combines the rasterized soil and SOM classes block-wise via _ERODIBILITY_LUT."""
+    ds_soil = gdal.Open(soil_path, gdal.GA_ReadOnly)
+    ds_som = gdal.Open(som_path, gdal.GA_ReadOnly)
+    if ds_soil is None or ds_som is None:
+        raise QgsProcessingException("Rasterized class layers could not be opened.")
+    b_soil = ds_soil.GetRasterBand(1)
+    b_som = ds_som.GetRasterBand(1)
+    nx, ny = ds_soil.RasterXSize, ds_soil.RasterYSize
+    if (ds_som.RasterXSize, ds_som.RasterYSize) != (nx, ny):
+        raise QgsProcessingException("Rasterized class layers do not share the same grid.")
+    nd_soil = b_soil.GetNoDataValue()
+    nd_som = b_som.GetNoDataValue()
+
+    drv = gdal.GetDriverByName("GTiff")
+    ods = drv.Create(
+        str(out_path), nx, ny, 1, gdal.GDT_Float32,
+        options=["TILED=YES", "COMPRESS=LZW", "BIGTIFF=IF_SAFER"],
+    )
+    if ods is None:
+        raise QgsProcessingException(f"Output raster could not be created: {out_path}")
+    ods.SetGeoTransform(ds_soil.GetGeoTransform())
+    ods.SetProjection(ds_soil.GetProjection())
+    ob = ods.GetRasterBand(1)
+    ob.SetNoDataValue(_ERODIBILITY_NODATA)
+
+    bx, by = ob.GetBlockSize()
+    n_rows = max(1, (ny + by - 1) // by)
+    for r, yoff in enumerate(range(0, ny, by)):
+        ys = min(by, ny - yoff)
+        for xoff in range(0, nx, bx):
+            xs = min(bx, nx - xoff)
+            soil = b_soil.ReadAsArray(xoff, yoff, xs, ys)
+            som = b_som.ReadAsArray(xoff, yoff, xs, ys)
+            si, s_ok = _class_index(soil, 6, nd_soil)
+            mi, m_ok = _class_index(som, 4, nd_som)
+            out = _ERODIBILITY_LUT[si, mi]
+            out[~(s_ok & m_ok)] = _ERODIBILITY_NODATA
+            ob.WriteArray(out, xoff, yoff)
+        if feedback is not None:
+            if feedback.isCanceled():
+                ob = ods = None
+                b_soil = b_som = None
+                ds_soil = ds_som = None
+                drv.Delete(str(out_path))
+                raise QgsProcessingException("Aborted")
+            feedback.setProgress(100.0 * (r + 1) / n_rows)
+
+    ob.FlushCache()
+    ob = None
+    ods = None
+    b_soil = b_som = None
+    ds_soil = ds_som = None
+
 def classify(v, classifier):
     # Classification helper used when no CSV lookup is provided.
     # classifier == 1 → soil texture code groups (string) mapped to class 1–6
@@ -307,6 +387,17 @@ class tool_0_3_soil_erodibility(QgsProcessingAlgorithm):
         rWIDTH = dem_layer.width()
         rHEIGHT = dem_layer.height()
 
+        # Early reject: skip the whole pipeline if an input does not touch the DEM (bbox test only)
+        for vl, label in ((vSoil, "Soil"), (vSOM, "SOM")):
+            xform = QgsCoordinateTransform(rCRS, vl.crs(), context.transformContext())
+            try:
+                rEXT_in_vl_crs = xform.transformBoundingBox(rEXT)
+            except Exception:
+                continue  # transform failed – let the regular pipeline handle it
+            if not vl.extent().intersects(rEXT_in_vl_crs):
+                feedback.reportError(f"{label} layer does not overlap DEM")
+                return {self.OUTPUT_DIR: None}
+
 
         # Harmonize and prepare vectors
         feedback.pushInfo("Step 1: Preparing vector layers")
@@ -403,9 +494,13 @@ class tool_0_3_soil_erodibility(QgsProcessingAlgorithm):
                 vSoil_clip.updateFields()
 
             dst_idx = vSoil_clip.fields().indexFromName("Erod")
-            with edit(vSoil_clip):
-                for f in vSoil_clip.getFeatures():
-                    vSoil_clip.changeAttributeValue(f.id(), dst_idx, classify(f[fld_soil], 1))
+            src_idx = vSoil_clip.fields().indexFromName(fld_soil)
+            # collect all updates first and hand them to the provider in a single call
+            req = QgsFeatureRequest().setSubsetOfAttributes([src_idx]).setFlags(QgsFeatureRequest.NoGeometry)
+            changes = {}
+            for f in vSoil_clip.getFeatures(req):
+                changes[f.id()] = {dst_idx: classify(f[src_idx], 1)}
+            vSoil_clip.dataProvider().changeAttributeValues(changes)
 
         # SOM classification via field calculator (no Python loop)
         vSOM_clip = processing.run(
@@ -416,15 +511,8 @@ class tool_0_3_soil_erodibility(QgsProcessingAlgorithm):
                 "FIELD_TYPE": 1,  # integer
                 "FIELD_LENGTH": 1,
                 "NEW_FIELD": True,
-                "FORMULA": f"""
-                    CASE
-                      WHEN "{fld_SOM}" < 1 THEN 1
-                      WHEN "{fld_SOM}" <= 15 THEN 2
-                      WHEN "{fld_SOM}" < 30 THEN 3
-                      WHEN "{fld_SOM}" >= 30 THEN 4
-                      ELSE NULL
-                    END
-                """,
+                # branchless reclass: <1 → 1, 1..15 → 2, 15..30 → 3, >=30 → 4 (NULL stays NULL)
+                "FORMULA": _SOM_CLASS_FORMULA.format(fld=fld_SOM),
                 "OUTPUT": QgsProcessing.TEMPORARY_OUTPUT
             },
             context=context, feedback=feedback, is_child_algorithm=True
@@ -441,63 +529,75 @@ class tool_0_3_soil_erodibility(QgsProcessingAlgorithm):
         # Final erodibility map
         feedback.pushInfo("Step 4: Calculating final erodibility raster.")
 
-        soil = f"\"{rSoil.name()}@1\""  # dynamic, quoted layer name
-        #feedback.pushInfo(f"Soil Name: {rSoil.name()}")
+        # Fast path: NumPy lookup table streamed block-wise through GDAL (GeoTIFF output)
+        out = None
+        if os.path.splitext(out_dst)[1].lower() in (".tif", ".tiff"):
+            try:
+                _combine_erodibility(rSoil.source(), rSOM.source(), out_dst, feedback)
+                out = out_dst
+            except Exception as e_lut:
+                if feedback.isCanceled():
+                    raise
+                feedback.reportError(f"Lookup-table combine failed ({e_lut}); falling back to the raster calculator.")
+
+        if out is None:
+            soil = f"\"{rSoil.name()}@1\""  # dynamic, quoted layer name
+            #feedback.pushInfo(f"Soil Name: {rSoil.name()}")
         
-        soml = f"\"{rSOM.name()}@1\""   # dynamic, quoted layer name
-        #feedback.pushInfo(f"Soil Name: \"{rSOM.name()}@1\"")
-
-        expr = f"""
-            if({soml} = 4, 5,
-                if({soil} = 1 AND {soml} = 1, 1,
-                if({soil} = 2 AND {soml} = 1, 2,
-                if({soil} = 3 AND {soml} = 1, 3,
-                if({soil} = 4 AND {soml} = 1, 4,
-                if({soil} = 5 AND {soml} = 1, 5,
-                if({soil} = 6 AND {soml} = 1, 5,
-                if({soil} = 1 AND {soml} = 2, 0,
-                if({soil} = 2 AND {soml} = 2, 1,
-                if({soil} = 3 AND {soml} = 2, 2,
-                if({soil} = 4 AND {soml} = 2, 3,
-                if({soil} = 5 AND {soml} = 2, 4,
-                if({soil} = 6 AND {soml} = 2, 5,
-                if({soil} = 1 AND {soml} = 3, 1,
-                if({soil} = 2 AND {soml} = 3, 2,
-                if({soil} = 3 AND {soml} = 3, 3,
-                if({soil} = 4 AND {soml} = 3, 4,
-                if({soil} = 5 AND {soml} = 3, 5,
-                if({soil} = 6 AND {soml} = 3, 5,
-                   -9999
-                )))))))))))))))))))
-            """
-
-        try:
-            out = processing.run(
-                "native:rastercalc",
-                {
-                    "LAYERS": [rSoil, rSOM],
-                    "EXPRESSION": expr,
-                    "EXTENT": rEXT,
-                    "CRS": rCRS,
-                    "OUTPUT": out_dst
-                },
-                context=context, feedback=feedback, is_child_algorithm=True
-            )["OUTPUT"]
-        except Exception as e_native:
-            feedback.reportError(f"Native raster calculator failed ({e_native}); switching to QGIS raster calculator. This might occour due to the OpenCL backend.\n Try disabling OpenCl.")
-            out = processing.run(
-                "qgis:rastercalculator",
-                {
-                    "EXPRESSION": expr.replace(rSoil.name(), "A").replace(rSOM.name(), "B").replace('"', ''),
-                    "LAYERS": [rSoil, rSOM],
-                    "CRS": rCRS,
-                    "EXTENT": rEXT,
-                    "WIDTH": rWIDTH,
-                    "HEIGHT": rHEIGHT,
-                    "OUTPUT": out_dst
-                },
-                context=context, feedback=feedback, is_child_algorithm=True
-            )["OUTPUT"]
+            soml = f"\"{rSOM.name()}@1\""   # dynamic, quoted layer name
+            #feedback.pushInfo(f"Soil Name: \"{rSOM.name()}@1\"")
+
+            expr = f"""
+                if({soml} = 4, 5,
+                    if({soil} = 1 AND {soml} = 1, 1,
+                    if({soil} = 2 AND {soml} = 1, 2,
+                    if({soil} = 3 AND {soml} = 1, 3,
+                    if({soil} = 4 AND {soml} = 1, 4,
+                    if({soil} = 5 AND {soml} = 1, 5,
+                    if({soil} = 6 AND {soml} = 1, 5,
+                    if({soil} = 1 AND {soml} = 2, 0,
+                    if({soil} = 2 AND {soml} = 2, 1,
+                    if({soil} = 3 AND {soml} = 2, 2,
+                    if({soil} = 4 AND {soml} = 2, 3,
+                    if({soil} = 5 AND {soml} = 2, 4,
+                    if({soil} = 6 AND {soml} = 2, 5,
+                    if({soil} = 1 AND {soml} = 3, 1,
+                    if({soil} = 2 AND {soml} = 3, 2,
+                    if({soil} = 3 AND {soml} = 3, 3,
+                    if({soil} = 4 AND {soml} = 3, 4,
+                    if({soil} = 5 AND {soml} = 3, 5,
+                    if({soil} = 6 AND {soml} = 3, 5,
+                       -9999
+                    )))))))))))))))))))
+                """
+
+            try:
+                out = processing.run(
+                    "native:rastercalc",
+                    {
+                        "LAYERS": [rSoil, rSOM],
+                        "EXPRESSION": expr,
+                        "EXTENT": rEXT,
+                        "CRS": rCRS,
+                        "OUTPUT": out_dst
+                    },
+                    context=context, feedback=feedback, is_child_algorithm=True
+                )["OUTPUT"]
+            except Exception as e_native:
+                feedback.reportError(f"Native raster calculator failed ({e_native}); switching to QGIS raster calculator. This might occour due to the OpenCL backend.\n Try disabling OpenCl.")
+                out = processing.run(
+                    "qgis:rastercalculator",
+                    {
+                        "EXPRESSION": expr.replace(rSoil.name(), "A").replace(rSOM.name(), "B").replace('"', ''),
+                        "LAYERS": [rSoil, rSOM],
+                        "CRS": rCRS,
+                        "EXTENT": rEXT,
+                        "WIDTH": rWIDTH,
+                        "HEIGHT": rHEIGHT,
+                        "OUTPUT": out_dst
+                    },
+                    context=context, feedback=feedback, is_child_algorithm=True
+                )["OUTPUT"]
         # except Exception as e_qgis:
         #     # gezielte OpenCL-Hilfestellung
         #     if _is_opencl_error(e_qgis):
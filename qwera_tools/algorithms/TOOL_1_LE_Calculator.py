@@ -18,16 +18,637 @@ from qgis.core import (
     QgsFeatureRequest,
     QgsFields, 
     QgsWkbTypes,
-    QgsVectorLayer
+    QgsVectorLayer,
+    QgsGeometry,
+    QgsProcessingUtils,
+    QgsRectangle,
+    QgsSpatialIndex,
+    QgsRasterFileWriter,
+    QgsCoordinateTransform,
+    QgsCsException,
+    QgsPointXY,
+    QgsProcessingParameterEnum
 )
 from qgis import processing
+from osgeo import gdal
+import numpy as np
+import itertools
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 import os
+import shutil
+import uuid
+import hashlib
+import tempfile
+import time
+from xml.sax.saxutils import escape
+
+
+def _fused_diff_kernel(a, b, m, has_mask, nd_a, nd_b, nd_out, out, valid):
+    """One pass over a block: NoData check, field-block mask and max(a - b, 0).
+
+    valid receives the per-cell validity, so the Int16 quantization does not have to
+    guess it from out (nd_out may be NaN or a legal height such as 0).
+    """
+    ny, nx = a.shape
+    for i in range(ny):
+        for j in range(nx):
+            ai = a[i, j]
+            bi = b[i, j]
+            if ai == nd_a or bi == nd_b or not (math.isfinite(ai) and math.isfinite(bi)):
+                out[i, j] = nd_out
+                valid[i, j] = False
+            elif has_mask and m[i, j] == 1:
+                out[i, j] = 0.0
+                valid[i, j] = True
+            else:
+                d = ai - bi
+                out[i, j] = d if d > 0.0 else 0.0
+                valid[i, j] = True
+
+
+_NO_MASK = np.zeros((1, 1), dtype=np.uint8)
+_FUSED_DIFF = None  # compiled kernel, False if numba is unavailable
+
+
+def _get_fused_diff():
+    """Imports numba and compiles _fused_diff_kernel on first use (not at plugin load).
+
+    cache=True stores the machine code next to the module, so later QGIS sessions skip
+    the JIT warm-up. Returns None when numba is missing or compilation fails.
+    """
+    global _FUSED_DIFF
+    if _FUSED_DIFF is None:
+        _FUSED_DIFF = False
+        try:
+            from numba import njit
+        except ImportError:  # numba is optional – NumPy path is used instead
+            return None
+        a = np.zeros((1, 1), dtype=np.float32)
+        # Blocks are already spread over a thread pool, so the kernel runs serially per call but
+        # releases the GIL. No 'nnan'/'ninf' fastmath flags: the NoData test relies on isfinite.
+        for cache in (True, False):  # plugin folder may be read-only -> retry without cache
+            try:
+                fn = njit(
+                    nogil=True, boundscheck=False, cache=cache,
+                    fastmath={"nsz", "arcp", "contract", "afn", "reassoc"},
+                )(_fused_diff_kernel)
+                fn(
+                    a, a, _NO_MASK, False, np.float32(np.nan), np.float32(np.nan),
+                    np.float32(-9999.0), a.copy(), np.zeros((1, 1), dtype=np.bool_),
+                )
+                _FUSED_DIFF = fn
+                break
+            except Exception:
+                continue
+    return _FUSED_DIFF or None
+
+
+def _same_pixel_grid(dgm, dom, tol=1e-6):
+    """True if DSM and DEM share pixel size and grid origin (offsets are multiples of the pixel size)."""
+    px = dgm.rasterUnitsPerPixelX()
+    py = dgm.rasterUnitsPerPixelY()
+    if abs(dom.rasterUnitsPerPixelX() - px) > tol * px or abs(dom.rasterUnitsPerPixelY() - py) > tol * py:
+        return False
+    e1, e2 = dgm.extent(), dom.extent()
+    offx = (e2.xMinimum() - e1.xMinimum()) % px
+    offy = (e2.yMaximum() - e1.yMaximum()) % py
+    return min(offx, px - offx) <= tol * px and min(offy, py - offy) <= tol * py
+
+
+def _grids_aligned(dgm, dom, tol=1e-6):
+    """True if DSM and DEM share pixel size, extent and grid origin (within tol × pixel size)."""
+    if not _same_pixel_grid(dgm, dom, tol):
+        return False
+    px = dgm.rasterUnitsPerPixelX()
+    py = dgm.rasterUnitsPerPixelY()
+    e1, e2 = dgm.extent(), dom.extent()
+    return (
+        abs(e1.xMinimum() - e2.xMinimum()) <= tol * px
+        and abs(e1.xMaximum() - e2.xMaximum()) <= tol * px
+        and abs(e1.yMinimum() - e2.yMinimum()) <= tol * py
+        and abs(e1.yMaximum() - e2.yMaximum()) <= tol * py
+    )
+
+
+def _crs_drift(src_crs, dst_crs, extent, transform_context):
+    """Largest shift (in map units) of the four extent corners under src_crs -> dst_crs.
+
+    Near zero if both CRS describe the same coordinates (e.g. differently tagged definitions).
+    Returns inf if the corners cannot be transformed.
+    """
+    ct = QgsCoordinateTransform(src_crs, dst_crs, transform_context)
+    drift = 0.0
+    try:
+        for x in (extent.xMinimum(), extent.xMaximum()):
+            for y in (extent.yMinimum(), extent.yMaximum()):
+                p = ct.transform(QgsPointXY(x, y))
+                drift = max(drift, abs(p.x() - x), abs(p.y() - y))
+    except QgsCsException:
+        return math.inf
+    return drift
+
+
+def _polygon_rings_px(geom, gt):
+    """Splits a (multi)polygon QgsGeometry into parts of rings in pixel coordinates (col, row)."""
+    if QgsWkbTypes.isCurvedType(geom.wkbType()):
+        geom = QgsGeometry(geom.constGet().segmentize())
+    parts = geom.asMultiPolygon() if geom.isMultipart() else [geom.asPolygon()]
+    out = []
+    for part in parts:
+        rings = []
+        for ring in part:
+            if len(ring) < 3:
+                continue
+            xy = np.array([(pt.x(), pt.y()) for pt in ring], dtype=np.float64)
+            rings.append(np.column_stack(((xy[:, 0] - gt[0]) / gt[1], (xy[:, 1] - gt[3]) / gt[5])))
+        if rings:
+            out.append(rings)
+    return out
+
+
+def _fill_polygon(mask, rings, xoff=0, yoff=0):
+    """Even-odd scanline fill of one polygon (outer ring + holes) into a uint8 mask.
+
+    Pixel-centre rule as in gdal_rasterize without ALL_TOUCHED. Ring coordinates refer to
+    the full grid, mask covers the window starting at (xoff, yoff).
+    """
+    h, w = mask.shape
+    p0 = np.concatenate(rings)
+    p1 = np.concatenate([np.roll(r, -1, axis=0) for r in rings])
+    keep = p0[:, 1] != p1[:, 1]  # horizontal edges never cross a scanline
+    if not keep.any():
+        return
+    x0, y0 = p0[keep, 0], p0[keep, 1]
+    x1, y1 = p1[keep, 0], p1[keep, 1]
+    slope = (x1 - x0) / (y1 - y0)
+
+    r_start = max(yoff, int(math.ceil(min(y0.min(), y1.min()) - 0.5)))
+    r_end = min(yoff + h, int(math.floor(max(y0.max(), y1.max()) - 0.5)) + 1)
+    for r in range(r_start, r_end):
+        yc = r + 0.5
+        hit = (y0 <= yc) != (y1 <= yc)
+        if not hit.any():
+            continue
+        xs = np.sort(x0[hit] + (yc - y0[hit]) * slope[hit])
+        c0 = np.clip(np.ceil(xs[0::2] - 0.5).astype(np.int64) - xoff, 0, w)
+        c1 = np.clip(np.ceil(xs[1::2] - 0.5).astype(np.int64) - xoff, 0, w)
+        row = mask[r - yoff]
+        for a, b in zip(c0, c1):
+            if b > a:
+                row[a:b] = 1
+
+
+def _index_polygons(layer, gt, xform=None, feedback=None):
+    """Reads the polygons of layer once, transformed into the DEM CRS on the fly.
+
+    xform is an optional QgsCoordinateTransform (layer CRS -> DEM CRS), so the layer does not
+    have to be reprojected to a temporary file first. Features that cannot be transformed are
+    skipped with one warning. Returns a QgsSpatialIndex over the features and a dict
+    fid -> polygon parts in pixel coordinates, so blocks can look up and fill only the
+    polygons they intersect.
+    """
+    index = QgsSpatialIndex()
+    parts_by_fid = {}
+    failed = []
+    for f in layer.getFeatures(QgsFeatureRequest().setNoAttributes()):
+        if not f.hasGeometry():
+            continue
+        geom = f.geometry()
+        if xform is not None:
+            try:
+                geom.transform(xform)
+            except QgsCsException:
+                failed.append(f.id())
+                continue
+        parts = _polygon_rings_px(geom, gt)
+        if parts:
+            parts_by_fid[f.id()] = parts
+            index.addFeature(f.id(), geom.boundingBox())
+    if failed and feedback is not None:
+        shown = ", ".join(str(fid) for fid in failed[:20]) + (" …" if len(failed) > 20 else "")
+        feedback.pushWarning(
+            f"{len(failed)} field block(s) could not be reprojected and were skipped: {shown}"
+        )
+    return index, parts_by_fid
+
+
+def _rasterize_mask(parts_by_fid, nx, ny):
+    """Rasterizes all indexed polygons into a full (ny, nx) uint8 mask."""
+    mask = np.zeros((ny, nx), dtype=np.uint8)
+    for parts in parts_by_fid.values():
+        for rings in parts:
+            _fill_polygon(mask, rings)
+    return mask
+
+
+def _write_mask(mask, gt, proj, path):
+    """Writes a uint8 mask as Byte GeoTIFF (used by the raster calculator fallback)."""
+    ds = gdal.GetDriverByName("GTiff").Create(
+        str(path), mask.shape[1], mask.shape[0], 1, gdal.GDT_Byte,
+        options=["TILED=YES", "COMPRESS=LZW"],
+    )
+    if ds is None:
+        raise QgsProcessingException(f"Mask raster could not be created: {path}")
+    ds.SetGeoTransform(gt)
+    ds.SetProjection(proj)
+    ds.GetRasterBand(1).WriteArray(mask)
+    ds.FlushCache()
+    ds = None
+
+
+_VSIMEM_MAX_BYTES = 512 * 1024 * 1024  # used when psutil is not available
+_WARP_MEMORY_LIMIT = 256 * 1024 * 1024  # working buffer of gdal.Warp in bytes
+
+
+def _fits_in_memory(nbytes):
+    """True if an intermediate of nbytes may be kept in /vsimem (at most 1/3 of free RAM)."""
+    try:
+        import psutil
+        return nbytes <= psutil.virtual_memory().available // 3
+    except Exception:
+        return nbytes <= _VSIMEM_MAX_BYTES
+
+
+_COMPRESSIONS = ["DEFLATE", "LZW", "ZSTD", "NONE"]
+_PRECISIONS = ["Float32", "Int16 (cm, scale=0.01)"]
+_INT16_NODATA = -32768
+
+
+def _gtiff_options(compression="DEFLATE", predictor=3):
+    """GeoTIFF creation options: 512x512 tiles, compression with predictor, BigTIFF if needed.
+
+    PREDICTOR=3 (floating point) suits the near-zero height differences. ZSTD falls back to
+    DEFLATE if the GDAL build does not support it.
+    """
+    opts = ["TILED=YES", "BLOCKXSIZE=512", "BLOCKYSIZE=512", "BIGTIFF=IF_SAFER"]
+    if compression == "ZSTD":
+        co_list = gdal.GetDriverByName("GTiff").GetMetadataItem("DMD_CREATIONOPTIONLIST") or ""
+        if "ZSTD" not in co_list:
+            compression = "DEFLATE"
+    if compression and compression != "NONE":
+        opts += [f"COMPRESS={compression}", f"PREDICTOR={predictor}", "NUM_THREADS=ALL_CPUS"]
+    return opts
+
+
+_WARP_CACHE_DIR = os.path.join(tempfile.gettempdir(), "qwera_cache")
+_WARP_CACHE_MAX_AGE_DAYS = 7
+
+
+def _warp_cache_path(dom, dgm, resample):
+    """Cache file for the DSM warped onto the DEM grid.
+
+    The SHA1 key covers the DSM file (path, mtime, size), both CRS, the DEM extent and pixel
+    size and the resampling, so any change of the inputs yields a new entry.
+    """
+    src = dom.source()
+    try:
+        st = os.stat(src)
+        stamp = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        stamp = None
+    ext = dgm.extent()
+    key = repr((
+        src, stamp, dom.crs().toWkt(), dgm.crs().toWkt(),
+        (ext.xMinimum(), ext.yMinimum(), ext.xMaximum(), ext.yMaximum()),
+        dgm.rasterUnitsPerPixelX(), dgm.rasterUnitsPerPixelY(), resample,
+    ))
+    return os.path.join(_WARP_CACHE_DIR, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".tif")
+
+
+def expire_warp_cache(max_age_days=_WARP_CACHE_MAX_AGE_DAYS):
+    """Removes cached warps older than max_age_days (called when the plugin is loaded)."""
+    if not os.path.isdir(_WARP_CACHE_DIR):
+        return
+    cutoff = time.time() - max_age_days * 86400
+    with os.scandir(_WARP_CACHE_DIR) as it:
+        for entry in it:
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+
+def _warp_to_grid(src_path, src_crs, dst_path, dgm, resample="bilinear"):
+    """Warps a raster onto the DEM grid (CRS, extent, pixel size) with gdal.Warp in-process.
+
+    The warper works chunk by chunk within _WARP_MEMORY_LIMIT and writes 512x512 tiles, so
+    the result can be streamed block-wise by _stream_diff without holding it in RAM.
+    """
+    ext = dgm.extent()
+    ds = gdal.Warp(
+        dst_path,
+        src_path,
+        srcSRS=src_crs.toWkt(),
+        dstSRS=dgm.crs().toWkt(),
+        outputBounds=[ext.xMinimum(), ext.yMinimum(), ext.xMaximum(), ext.yMaximum()],
+        xRes=dgm.rasterUnitsPerPixelX(),
+        yRes=dgm.rasterUnitsPerPixelY(),
+        resampleAlg=resample,
+        outputType=gdal.GDT_Float32,
+        multithread=True,
+        warpOptions=["NUM_THREADS=ALL_CPUS"],
+        warpMemoryLimit=_WARP_MEMORY_LIMIT,
+        format="GTiff",
+        creationOptions=["TILED=YES", "BLOCKXSIZE=512", "BLOCKYSIZE=512", "BIGTIFF=IF_SAFER"],
+    )
+    if ds is None:
+        raise QgsProcessingException(f"gdal.Warp failed for {src_path}")
+    ds.FlushCache()
+    ds = None
+    return dst_path
+
+
+def _block_windows(nx, ny, bx, by):
+    """Yields (xoff, yoff, xsize, ysize) windows aligned to the raster block layout."""
+    if bx >= nx:
+        by = max(by, 256)  # group strip-organised rasters into windows of >= 256 rows
+    for yoff in range(0, ny, by):
+        ys = min(by, ny - yoff)
+        for xoff in range(0, nx, bx):
+            yield xoff, yoff, min(bx, nx - xoff), ys
+
+
+def _stream_diff(dom_path, dem_path, out_path, polygons=None, feedback=None, max_workers=None,
+                 creation_options=None, int16_scale=None):
+    """Streams max(DSM - DEM, 0) block by block into a GeoTIFF (Float32 or scaled Int16).
+
+    Cells inside the optional field-block polygons (the (index, parts_by_fid) pair from
+    _index_polygons) are set to 0; each block only fills the polygons whose bounding box
+    it intersects. NoData in either input stays NoData. Both rasters must share the same
+    grid. Blocks are read and computed in a thread pool (one set of GDAL handles per
+    worker); writing stays on the calling thread. creation_options default to
+    _gtiff_options().
+
+    With int16_scale (e.g. 0.01) the heights are stored as Int16 in units of int16_scale
+    (NoData -32768) and the band gets SetScale/SetOffset, so QGIS shows metres again.
+    """
+    ds_a = gdal.Open(dom_path, gdal.GA_ReadOnly)
+    ds_b = gdal.Open(dem_path, gdal.GA_ReadOnly)
+    if ds_a is None or ds_b is None:
+        raise QgsProcessingException("DSM/DEM could not be opened with GDAL.")
+    nx, ny = ds_b.RasterXSize, ds_b.RasterYSize
+    gt = ds_b.GetGeoTransform()
+    if (ds_a.RasterXSize, ds_a.RasterYSize) != (nx, ny) or any(
+        abs(g1 - g2) > 1e-6 for g1, g2 in zip(ds_a.GetGeoTransform(), gt)
+    ):
+        raise QgsProcessingException("DSM and DEM grids are not aligned.")
+
+    band_b = ds_b.GetRasterBand(1)
+    nd_a = ds_a.GetRasterBand(1).GetNoDataValue()
+    nd_b = band_b.GetNoDataValue()
+    nd_out = float(nd_b) if nd_b is not None else -9999.0
+    nd_file = _INT16_NODATA if int16_scale else nd_out
+    bx, by = band_b.GetBlockSize()
+    proj = ds_b.GetProjection()
+    band_b = None
+    ds_a = ds_b = None
+
+    drv = gdal.GetDriverByName("GTiff")
+    ods = drv.Create(
+        str(out_path), nx, ny, 1, gdal.GDT_Int16 if int16_scale else gdal.GDT_Float32,
+        options=creation_options or _gtiff_options(predictor=2 if int16_scale else 3),
+    )
+    if ods is None:
+        raise QgsProcessingException(f"Output raster could not be created: {out_path}")
+    ods.SetGeoTransform(gt)
+    ods.SetProjection(proj)
+    ob = ods.GetRasterBand(1)
+    ob.SetNoDataValue(nd_file)
+    if int16_scale:
+        ob.SetScale(int16_scale)
+        ob.SetOffset(0.0)
+
+    # GDAL datasets must not be shared between threads -> one set of handles per worker
+    local = threading.local()
+    opened = []
+    opened_lock = threading.Lock()
+
+    def _bands():
+        h = getattr(local, "bands", None)
+        if h is None:
+            dss = [gdal.Open(dom_path, gdal.GA_ReadOnly), gdal.Open(dem_path, gdal.GA_ReadOnly)]
+            with opened_lock:
+                opened.append(dss)
+            h = local.bands = [d.GetRasterBand(1) for d in dss]
+        return h
+
+    fused = _get_fused_diff()  # compile once before the workers start
+
+    def _candidates(win):
+        # runs on the calling thread: QGIS objects are not touched by the workers
+        if polygons is None:
+            return []
+        index, parts_by_fid = polygons
+        xoff, yoff, xs, ys = win
+        rect = QgsRectangle(
+            gt[0] + xoff * gt[1], gt[3] + (yoff + ys) * gt[5],
+            gt[0] + (xoff + xs) * gt[1], gt[3] + yoff * gt[5],
+        )
+        return [parts_by_fid[fid] for fid in index.intersects(rect)]
+
+    def _quantize(out, valid=None):
+        if not int16_scale:
+            return out
+        q = np.full(out.shape, _INT16_NODATA, dtype=np.int16)
+        ok = valid if valid is not None else np.isfinite(out) & (out != nd_out)
+        q[ok] = np.clip(np.rint(out[ok] / int16_scale), -32767, 32767)
+        return q
+
+    def _work(win, cand):
+        xoff, yoff, xs, ys = win
+        bands = _bands()
+        a = bands[0].ReadAsArray(xoff, yoff, xs, ys).astype(np.float32, copy=False)
+        b = bands[1].ReadAsArray(xoff, yoff, xs, ys).astype(np.float32, copy=False)
+        m = None
+        if cand:
+            m = np.zeros((ys, xs), dtype=np.uint8)
+            for parts in cand:
+                for rings in parts:
+                    _fill_polygon(m, rings, xoff, yoff)
+        if fused is not None:
+            out = np.empty((ys, xs), dtype=np.float32)
+            valid = np.empty((ys, xs), dtype=np.bool_)
+            fused(
+                a, b, m if m is not None else _NO_MASK, m is not None,
+                np.float32(nd_a if nd_a is not None else np.nan),
+                np.float32(nd_b if nd_b is not None else np.nan),
+                np.float32(nd_out), out, valid,
+            )
+            return win, _quantize(out, valid)
+        # Gültigkeitsmaske einmal pro Block, für NoData-Setzen und Int16-Quantisierung
+        valid = np.isfinite(a)
+        valid &= np.isfinite(b)
+        if nd_a is not None:
+            valid &= (a != nd_a)
+        if nd_b is not None:
+            valid &= (b != nd_b)
+        out = np.subtract(a, b, dtype=np.float32)
+        np.maximum(out, 0.0, out=out)
+        if m is not None:
+            out[m == 1] = 0.0
+        out[~valid] = nd_out
+        return win, _quantize(out, valid)
+
+    windows = list(_block_windows(nx, ny, bx, by))
+    n_win = max(1, len(windows))
+    workers = max(1, min(max_workers or os.cpu_count() or 1, n_win))
+    todo = iter(windows)
+    done_n = 0
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            # keep only a few windows in flight so results do not pile up in memory
+            pending = {ex.submit(_work, w, _candidates(w)) for w in itertools.islice(todo, 2 * workers)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    (xoff, yoff, _, _), out = fut.result()
+                    ob.WriteArray(out, xoff, yoff)
+                    done_n += 1
+                canceled = feedback is not None and feedback.isCanceled()
+                if not canceled:
+                    for w in itertools.islice(todo, len(done)):
+                        pending.add(ex.submit(_work, w, _candidates(w)))
+                if feedback is not None:
+                    feedback.setProgress(100.0 * done_n / n_win)
+    finally:
+        ob.FlushCache()
+        ob = None
+        ods = None
+        opened.clear()
+
+
+def _derived_vrt(path, nx, ny, gt, proj, nodata, func, sources, args=""):
+    """Writes a VRT with one Float32 derived band (built-in GDAL pixel function over sources).
+
+    sources is a list of (raster path, source NoData or None, scale ratio).
+    """
+    src_xml = []
+    for src, nd, ratio in sources:
+        nd_xml = f"<NODATA>{nd!r}</NODATA>" if nd is not None else ""
+        src_xml.append(
+            f'    <ComplexSource><SourceFilename relativeToVRT="0">{escape(os.path.abspath(src))}</SourceFilename>'
+            f"<SourceBand>1</SourceBand>"
+            f'<SrcRect xOff="0" yOff="0" xSize="{nx}" ySize="{ny}"/><DstRect xOff="0" yOff="0" xSize="{nx}" ySize="{ny}"/>'
+            f"{nd_xml}<ScaleRatio>{ratio!r}</ScaleRatio></ComplexSource>"
+        )
+    xml = (
+        f'<VRTDataset rasterXSize="{nx}" rasterYSize="{ny}">\n'
+        f"  <SRS>{escape(proj)}</SRS>\n"
+        f"  <GeoTransform>{', '.join(repr(float(g)) for g in gt)}</GeoTransform>\n"
+        f'  <VRTRasterBand dataType="Float32" band="1" subClass="VRTDerivedRasterBand">\n'
+        f"    <NoDataValue>{nodata!r}</NoDataValue>\n"
+        f"    <PixelFunctionType>{func}</PixelFunctionType>\n"
+        f"    <PixelFunctionArguments {args}/>\n"
+        + "\n".join(src_xml) + "\n"
+        "  </VRTRasterBand>\n"
+        "</VRTDataset>\n"
+    )
+    with open(path, "w", encoding="utf-8") as fh:
+        fh.write(xml)
+    return path
+
+
+def _write_lazy_vrt(out_path, dom_path, dem_path, keep_mask_path=None):
+    """Writes max(DSM - DEM, 0) as a chain of derived VRT bands that GDAL evaluates at read time.
+
+    Only built-in pixel functions are used (sum with the DEM scaled by -1, max with k=0 and,
+    for field blocks, mul with keep_mask_path: a Byte raster with 0 inside and 1 outside), so no
+    Python pixel functions have to be enabled. Needs GDAL >= 3.8 (min/max, propagateNoData).
+    """
+    if int(gdal.VersionInfo()) < 3080000:
+        raise QgsProcessingException("lazy VRT output needs GDAL >= 3.8")
+    ds_b = gdal.Open(dem_path, gdal.GA_ReadOnly)
+    ds_a = gdal.Open(dom_path, gdal.GA_ReadOnly)
+    if ds_a is None or ds_b is None:
+        raise QgsProcessingException("DSM/DEM could not be opened with GDAL.")
+    nx, ny = ds_b.RasterXSize, ds_b.RasterYSize
+    gt, proj = ds_b.GetGeoTransform(), ds_b.GetProjection()
+    nd_a = ds_a.GetRasterBand(1).GetNoDataValue()
+    nd_b = ds_b.GetRasterBand(1).GetNoDataValue()
+    ds_a = ds_b = None
+    nd_out = float(nd_b) if nd_b is not None else -9999.0
+
+    base = os.path.splitext(out_path)[0]
+    nd_args = 'propagateNoData="true"'
+    diff = _derived_vrt(
+        f"{base}_diff.vrt", nx, ny, gt, proj, nd_out, "sum",
+        [(dom_path, nd_a, 1.0), (dem_path, nd_b, -1.0)], nd_args,
+    )
+    clip_path = f"{base}_max.vrt" if keep_mask_path else out_path
+    _derived_vrt(clip_path, nx, ny, gt, proj, nd_out, "max", [(diff, nd_out, 1.0)], f'k="0" {nd_args}')
+    if keep_mask_path:
+        _derived_vrt(out_path, nx, ny, gt, proj, nd_out, "mul",
+                     [(clip_path, nd_out, 1.0), (keep_mask_path, None, 1.0)], nd_args)
+    return out_path
+
+
+def _missing_vrt_sources(vrt_path):
+    """Source files of a (nested) VRT that do not exist on disk."""
+    ds = gdal.Open(vrt_path, gdal.GA_ReadOnly)
+    if ds is None:
+        return [vrt_path]
+    files = ds.GetFileList() or []
+    ds = None
+    return [f for f in files if not f.startswith("/vsi") and not os.path.exists(f)]
+
+
+def _finalize_output(tmp_path, out_path):
+    """Moves a finished GeoTIFF to out_path without re-encoding where possible.
+
+    GeoTIFF targets are renamed (os.replace) on the same filesystem and copied byte-wise
+    otherwise; other formats are converted once with gdal.Translate.
+    """
+    ext = os.path.splitext(out_path)[1].lower()
+    if ext in (".tif", ".tiff"):
+        out_dir = os.path.dirname(os.path.abspath(out_path))
+        if os.stat(tmp_path).st_dev == os.stat(out_dir).st_dev:
+            os.replace(tmp_path, out_path)
+        else:
+            shutil.move(tmp_path, out_path)
+        return out_path
+
+    fmt = QgsRasterFileWriter.driverForExtension(ext.lstrip("."))
+    if not fmt:
+        raise QgsProcessingException(f"No GDAL driver for output format '{ext}'.")
+    ds = gdal.Translate(out_path, tmp_path, format=fmt)
+    if ds is None:
+        raise QgsProcessingException(f"Output raster could not be written: {out_path}")
+    ds = None
+    gdal.GetDriverByName("GTiff").Delete(tmp_path)
+    return out_path
+
+
+def _remove_temp(path):
+    """Deletes an intermediate raster: gdal.Unlink for /vsimem, otherwise the file and its sidecars."""
+    if path.startswith("/vsimem/"):
+        gdal.Unlink(path)
+        return
+    if not os.path.exists(path):
+        return
+    try:
+        gdal.GetDriverByName("GTiff").Delete(path)
+    except Exception:
+        pass
+    for p in (path, path + ".aux.xml"):
+        try:
+            if os.path.exists(p):
+                os.remove(p)
+        except OSError:
+            pass  # noch von QGIS geöffnet – bleibt im Temp-Ordner der Sitzung
+
 
 class TOOLBOX_1(QgsProcessingAlgorithm):
     INPUT_DEM = "INPUT_DEM"
     INPUT_DOM = "INPUT_DOM"
     INPUT_VECTOR = "INPUT_VECTOR"       # optional^
     USE_SELECTION = "use_selection"
+    OUTPUT_COMPRESSION = "OUTPUT_COMPRESSION"
+    PRECISION = "PRECISION"
+    LAZY_VRT = "LAZY_VRT"
+    USE_WARP_CACHE = "USE_WARP_CACHE"
     OUTPUT_RASTER = "OUTPUT_RASTER"
     
     def icon(self):
@@ -62,7 +683,7 @@ class TOOLBOX_1(QgsProcessingAlgorithm):
             <h2>Description</h2>
             <p>
             This tool calculates the height difference <b>DSM − DEM</b> (Digital Surface Model minus Digital Elevation Model). Optionally, all cells located inside polygons of a given vector layer (e.g., field blocks) can be set to zero. 
-            Polygon layers are reprojected (warped) to the DGM’s CRS if needed. Bilinear Method is used for the raster transformation. To avoid interpolation artefacts and to have more control it might be an advantage to align the raster inputs in advance.
+            Polygon geometries are transformed to the DGM’s CRS on the fly if needed. Bilinear Method is used for the raster transformation (nearest neighbour if the DSM already lies on the DEM pixel grid). To avoid interpolation artefacts and to have more control it might be an advantage to align the raster inputs in advance.
             The generated grid contains the real heights of the landscape elements. The result is written to the defined output raster and automatically loaded into QGIS.
             </p>
 
@@ -81,13 +702,15 @@ class TOOLBOX_1(QgsProcessingAlgorithm):
 
             <h2>Outputs</h2>
             <dt><ul>
-            <li><b>Output LE_Raster</b> — Float32 raster representing landscape elements heights. Values inside optional field-block polygons are 0.</li>
+            <li><b>Output LE_Raster</b> — Float32 raster representing landscape elements heights. Values inside optional field-block polygons are 0. Optionally stored as Int16 in centimetres (scale 0.01, NoData −32768), which halves the file size. GeoTIFF output is tiled and compressed (advanced option <i>Output compression</i>, default DEFLATE).</li>
             <li><b>Automatic loading</b> — the output raster is automatically added to the QGIS project when processing completes.</li>
             </ul></dt>
 
             <h2>Notes</h2>
             <dt><ul>
             <li>NoData values are preserved in both inputs during subtraction.</li>
+            <li>With a <b>.vrt</b> output and the advanced option <i>Lazy VRT output</i>, no pixels are computed: the VRT evaluates max(DSM − DEM, 0) on read (GDAL ≥ 3.8). It references the inputs, so they must stay in place.</li>
+            <li>Scripts can set the hidden parameter <i>USE_WARP_CACHE</i> to reuse a warped DSM across runs (off by default). The cached files are written to the <b>qwera_cache</b> folder in the system temp directory and are removed after 7 days, when the plugin is loaded.</li>
             <li>ChatGPT was used to create this plugin.</li>
             <li>Tested with QGIS 3.44.x (Python 3.12, Windows).</li>
             </ul></dt>
@@ -123,6 +746,44 @@ class TOOLBOX_1(QgsProcessingAlgorithm):
             )
         )
 
+        # Speichergenauigkeit: Float32 oder Int16 in cm (halbe Dateigröße, Bereich bis 327 m)
+        self.addParameter(
+            QgsProcessingParameterEnum(
+                self.PRECISION,
+                self.tr("Output precision"),
+                options=_PRECISIONS,
+                defaultValue=0
+            )
+        )
+
+        # Kompression des Ergebnis-GeoTIFFs (gekachelt, mit Predictor)
+        p_comp = QgsProcessingParameterEnum(
+            self.OUTPUT_COMPRESSION,
+            self.tr("Output compression"),
+            options=_COMPRESSIONS,
+            defaultValue=0
+        )
+        p_comp.setFlags(p_comp.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(p_comp)
+
+        # .vrt-Ausgabe ohne Pixelberechnung: GDAL rechnet beim Lesen (Anzeige in QGIS)
+        p_lazy = QgsProcessingParameterBoolean(
+            self.LAZY_VRT,
+            self.tr("Lazy VRT output (compute on read, only for .vrt outputs)"),
+            defaultValue=False
+        )
+        p_lazy.setFlags(p_lazy.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(p_lazy)
+
+        # Cache für das gewarpte DOM (versteckt, für Skripte einschaltbar; Standard: aus)
+        p_cache = QgsProcessingParameterBoolean(
+            self.USE_WARP_CACHE,
+            self.tr("Reuse warped DSM from previous runs"),
+            defaultValue=False
+        )
+        p_cache.setFlags(p_cache.flags() | QgsProcessingParameterDefinition.FlagHidden)
+        self.addParameter(p_cache)
+
         # Output: TEMPORARY_OUTPUT als Default sorgt für automatisches Laden
         self.addParameter(
             QgsProcessingParameterRasterDestination(
@@ -139,27 +800,31 @@ class TOOLBOX_1(QgsProcessingAlgorithm):
         #feldblock = self.parameterAsSource(parameters, self.INPUT_VECTOR, context)  # kann None sein
         feldblock = self.parameterAsVectorLayer(parameters, self.INPUT_VECTOR, context)
         use_sel = self.parameterAsBool(parameters, self.USE_SELECTION, context)
+        compression = _COMPRESSIONS[self.parameterAsEnum(parameters, self.OUTPUT_COMPRESSION, context)]
+        int16_scale = 0.01 if self.parameterAsEnum(parameters, self.PRECISION, context) == 1 else None
+        out_path = self.parameterAsOutputLayer(parameters, self.OUTPUT_RASTER, context)
+        as_vrt = os.path.splitext(out_path)[1].lower() == ".vrt"
+        lazy_vrt = as_vrt and self.parameterAsBool(parameters, self.LAZY_VRT, context)
+        use_cache = self.parameterAsBool(parameters, self.USE_WARP_CACHE, context)
 
-        feldblock_sel = feldblock.getSelectedFeatures() if (use_sel and feldblock.selectedFeatureCount() > 0) else feldblock.getFeatures(QgsFeatureRequest())
-    
-
-        # Memory-Layer erzeugen
-        mem = QgsVectorLayer(
-            f"{QgsWkbTypes.displayString(feldblock.wkbType())}?crs={feldblock.crs().authid()}",
-            "feldblock_sel",
-            "memory"
-        )
-        prov = mem.dataProvider()
-        prov.addAttributes(feldblock.fields())
-        mem.updateFields()
-
-        # Features kopieren
-        prov.addFeatures(feldblock_sel)
-        mem.updateExtents()
+        if feldblock is not None:
+            feldblock_sel = feldblock.getSelectedFeatures() if (use_sel and feldblock.selectedFeatureCount() > 0) else feldblock.getFeatures(QgsFeatureRequest())
 
-        feldblock = mem
+            # Memory-Layer erzeugen
+            mem = QgsVectorLayer(
+                f"{QgsWkbTypes.displayString(feldblock.wkbType())}?crs={feldblock.crs().authid()}",
+                "feldblock_sel",
+                "memory"
+            )
+            prov = mem.dataProvider()
+            prov.addAttributes(feldblock.fields())
+            mem.updateFields()
 
+            # Features kopieren
+            prov.addFeatures(feldblock_sel)
+            mem.updateExtents()
 
+            feldblock = mem
 
         if dgm is None or dom is None:
             raise QgsProcessingException("Input rasters could not be read.")
@@ -170,140 +835,180 @@ class TOOLBOX_1(QgsProcessingAlgorithm):
         if abs(px - py) > 1e-9:
             feedback.pushWarning(f"Non-square pixels detected in DGM (px={px}, py={py}). Result will be written as Float32.")
         
-        # 1) optional, deaktiviert: DOM auf DGM-Grid bringen (gdal:warpreproject), Wenn aktiviret im calc-Teil richtige Inputparameter setzten
-        if dgm_crs != dom.crs():
-            feedback.pushInfo("CRS not the same. Warping")
-        # RESAMPLING: 1 = Bilinear (für Höhenmodelle sinnvoll)
-        # DATA_TYPE: 5 = Float32
-            warp_params = {
-                "INPUT": dom.source(),
-                "SOURCE_CRS": dom.crs(),    # robust, auch wenn DOM ein anderes CRS hat
-                "TARGET_CRS": dgm_crs,
-                "RESAMPLING": 1,
-                "NODATA": None,
-                "TARGET_RESOLUTION": px,
-                "TARGET_EXTENT": dgm.extent(),
-                "TARGET_EXTENT_CRS": dgm_crs,
-                "MULTITHREADING": True,
-                "DATA_TYPE": 5,
-                "OUTPUT": "TEMPORARY_OUTPUT",
-            }
-            dom_trans = processing.run(
-                "gdal:warpreproject", 
-                warp_params, 
-                context=context, 
-                feedback=feedback, 
-                is_child_algorithm=True
-            )["OUTPUT"]
-            dom = QgsRasterLayer(dom_trans, "dom")
-            if not dom.isValid():
-                raise QgsProcessingException("dom raster is invalid")
-        else:
-            feedback.pushInfo("CRS the same")
-            #dom = dom.source()
-
-        # 1) Differenz berechnen (DOM - DGM)
-
-        expr = f'"{dom.name()}@1" - "{dgm.name()}@1"'
-
-        diff = processing.run(
-                "native:rastercalc",
-                {
-                    "LAYERS": [dom, dgm],
-                    "EXPRESSION": expr,
-                    "EXTENT": dgm.extent(),
-                    "CRS": dgm.crs(),
-                    "OUTPUT": QgsProcessing.TEMPORARY_OUTPUT
-                },
-                context=context, feedback=feedback, is_child_algorithm=True
-            )["OUTPUT"]
-        
-        diff_layer = QgsRasterLayer(diff, "diff")
-        if not diff_layer.isValid():
-            raise QgsProcessingException("diff raster is invalid")
-
-        ## setting all values below zero to zero
-        expr_vdif = 'if("diff@1" < 0, 0, "diff@1")'
-        diff_raster = processing.run(
-                "native:rastercalc",
-                {
-                    "LAYERS": diff_layer,
-                    "EXPRESSION": expr_vdif,
-                    "EXTENT": diff_layer.extent(),
-                    "CRS": diff_layer.crs(),
-                    "OUTPUT": QgsProcessing.TEMPORARY_OUTPUT
-                },
-                context=context, feedback=feedback, is_child_algorithm=True
-            )["OUTPUT"]
-
-
-        # --- 2) OPTIONAL: Feldblöcke auf 0 brennen ---
-        if feldblock is not None:
-            vec_for_rasterize = feldblock
-            if feldblock.crs() != dgm_crs:
-                reproj = processing.run(
-                    "native:reprojectlayer",
-                    {
-                        "INPUT": feldblock,
+        temp_paths = []  # Zwischenergebnisse (/vsimem und Temp-Dateien), werden am Ende gelöscht
+        lazy_files = []  # Dateien, auf die die Lazy-VRT verweist (bleiben nur mit fertiger VRT liegen)
+        lazy_out = None
+        try:
+            # 1) DOM auf DGM-Grid bringen (gdal.Warp, Fallback gdal:warpreproject) – nur wenn CRS oder Raster-Grid abweichen
+            crs_differs = dgm_crs != dom.crs()
+            # Verschiebung der Eckpunkte durch die CRS-Transformation (0 bei gleichem CRS)
+            drift = _crs_drift(dom.crs(), dgm_crs, dom.extent(), context.transformContext()) if crs_differs else 0.0
+            if crs_differs and drift < 1e-6 * px and _grids_aligned(dgm, dom):
+                # nur anders getaggtes CRS: Pixel liegen bereits auf dem DGM-Grid, Ausgabe übernimmt das DGM-CRS
+                feedback.pushInfo("CRS definitions differ, but the grids coincide – no warp needed")
+            elif crs_differs or not _grids_aligned(dgm, dom):
+                feedback.pushInfo("CRS not the same. Warping" if crs_differs else "CRS the same, but grids differ. Warping to DEM grid")
+                # gleiche Pixelgröße/-lage und (nahezu) identische Transformation: Nearest statt Bilinear,
+                # die Pixel werden nur verschoben, nicht interpoliert
+                nearest = drift < 0.01 * px and _same_pixel_grid(dgm, dom, tol=0.01)
+                if nearest:
+                    feedback.pushInfo("DSM lies on the DEM pixel grid – using nearest neighbour resampling")
+                resample = "near" if nearest else "bilinear"
+                # gewarptes DOM zwischen Läufen wiederverwenden (gleiches DOM, gleiches DGM-Grid)
+                cache_path = _warp_cache_path(dom, dgm, resample) if use_cache and not lazy_vrt else None
+                try:
+                    if cache_path and os.path.exists(cache_path):
+                        feedback.pushInfo(f"Reusing cached warped DSM: {cache_path}")
+                        dom_trans = cache_path
+                    else:
+                        # Zwischenergebnis im GDAL-Arbeitsspeicher (/vsimem), wenn genug RAM frei ist;
+                        # die Lazy-VRT verweist dauerhaft darauf, dann als Datei neben der Ausgabe
+                        if lazy_vrt:
+                            dom_trans = os.path.splitext(out_path)[0] + "_dsm.tif"
+                        elif cache_path:
+                            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+                            dom_trans = f"{os.path.splitext(cache_path)[0]}_{uuid.uuid4().hex}.part.tif"
+                        elif _fits_in_memory(dgm.width() * dgm.height() * 4):
+                            dom_trans = f"/vsimem/qwera/warp_{uuid.uuid4().hex}.tif"
+                        else:
+                            dom_trans = QgsProcessingUtils.generateTempFilename("dsm_warp.tif")
+                        (lazy_files if lazy_vrt else temp_paths).append(dom_trans)
+                        _warp_to_grid(dom.source(), dom.crs(), dom_trans, dgm, resample)
+                        if cache_path:
+                            # erst nach vollständigem Warp unter dem Cache-Namen ablegen
+                            os.replace(dom_trans, cache_path)
+                            dom_trans = cache_path
+                except Exception as e:
+                    feedback.pushInfo(f"Direct GDAL warp failed ({e}); using gdal:warpreproject.")
+                    warp_params = {
+                        "INPUT": dom.source(),
+                        "SOURCE_CRS": dom.crs(),    # robust, auch wenn DOM ein anderes CRS hat
                         "TARGET_CRS": dgm_crs,
-                        "OPERATION": "",
-                        "OUTPUT": "TEMPORARY_OUTPUT",
-                    },
-                    context=context,
+                        "RESAMPLING": 0 if nearest else 1,  # 0 = Nearest, 1 = Bilinear (für Höhenmodelle sinnvoll)
+                        "NODATA": None,
+                        "TARGET_RESOLUTION": px,
+                        "TARGET_EXTENT": dgm.extent(),
+                        "TARGET_EXTENT_CRS": dgm_crs,
+                        "MULTITHREADING": True,
+                        "EXTRA": "-wo NUM_THREADS=ALL_CPUS",
+                        "DATA_TYPE": 5,             # Float32
+                        "OUTPUT": (
+                            os.path.splitext(out_path)[0] + "_dsm.tif" if lazy_vrt
+                            else QgsProcessingUtils.generateTempFilename("dsm_warp.tif")
+                        ),
+                    }
+                    (lazy_files if lazy_vrt else temp_paths).append(warp_params["OUTPUT"])
+                    dom_trans = processing.run(
+                        "gdal:warpreproject", 
+                        warp_params, 
+                        context=context, 
+                        feedback=feedback, 
+                        is_child_algorithm=True
+                    )["OUTPUT"]
+                dom = QgsRasterLayer(dom_trans, "dom")
+                if not dom.isValid():
+                    raise QgsProcessingException("dom raster is invalid")
+            else:
+                feedback.pushInfo("CRS and grid the same – no warp needed")
+
+            # 2) OPTIONAL: Feldblöcke in-process per Scanline als Byte-Maske (1 = innerhalb) auf das DGM-Grid
+            fb_polys = None
+            if feldblock is not None:
+                # Geometrien beim Einlesen ins DGM-CRS transformieren (kein reprojizierter Temp-Layer)
+                xform = None
+                if feldblock.crs() != dgm_crs:
+                    xform = QgsCoordinateTransform(feldblock.crs(), dgm_crs, context.transformContext())
+
+                ext = dgm.extent()
+                gt = (ext.xMinimum(), px, 0.0, ext.yMaximum(), 0.0, -py)
+                fb_polys = _index_polygons(feldblock, gt, xform, feedback)
+
+            # 3) Ein Rechendurchgang: max(DOM - DGM, 0), innerhalb der Feldblöcke 0,
+            #    direkt ins finale OUTPUT (=> Auto-Laden, keine Zwischenkopie)
+            if lazy_vrt:
+                try:
+                    keep_mask = None
+                    if fb_polys is not None:
+                        keep_mask = os.path.splitext(out_path)[0] + "_fbmask.tif"
+                        lazy_files.append(keep_mask)
+                        mask = _rasterize_mask(fb_polys[1], dgm.width(), dgm.height())
+                        np.subtract(1, mask, out=mask)  # 1 = außerhalb (bleibt), 0 = Feldblock
+                        _write_mask(mask, gt, dgm_crs.toWkt(), keep_mask)
+                        mask = None
+                    lazy_out = _write_lazy_vrt(out_path, dom.source(), dgm.source(), keep_mask)
+                    return {self.OUTPUT_RASTER: lazy_out}
+                except Exception as e:
+                    feedback.pushInfo(f"Lazy VRT not possible ({e}); computing the pixels.")
+
+            # VRT kann der Rechner nicht schreiben: Pixel in ein GeoTIFF daneben, VRT nur als Verweis
+            calc_out = os.path.splitext(out_path)[0] + ".tif" if as_vrt else out_path
+
+            # Schnellpfad: NumPy blockweise über GDAL in ein GeoTIFF (Raster müssen deckungsgleich sein).
+            # GeoTIFF entsteht im Zielordner und wird am Ende nur umbenannt; andere Formate einmal per gdal.Translate.
+            out = None
+            if os.path.splitext(calc_out)[1].lower() in (".tif", ".tiff"):
+                tmp_out = os.path.join(os.path.dirname(os.path.abspath(calc_out)), f".qwera_{uuid.uuid4().hex}.tif")
+            else:
+                tmp_out = QgsProcessingUtils.generateTempFilename("le_diff.tif")
+            try:
+                _stream_diff(
+                    dom.source(),
+                    dgm.source(),
+                    tmp_out,
+                    polygons=fb_polys,
                     feedback=feedback,
-                    is_child_algorithm=True
+                    creation_options=_gtiff_options(compression, predictor=2 if int16_scale else 3),
+                    int16_scale=int16_scale,
                 )
-                vec_for_rasterize = reproj["OUTPUT"]
-
-            # Brennt IN-PLACE in diff_raster
-            processing.run(
-                "gdal:rasterize_over_fixed_value",
-                {
-                    "INPUT": vec_for_rasterize,
-                    "INPUT_RASTER": diff_raster,
-                    "BURN": 0,
-                    "ADD": False,
-                    "EXTRA": None
-                },
-                context=context,
-                feedback=feedback,
-                is_child_algorithm=True
-            )
-
-            # WICHTIG: jetzt das (modifizierte) diff_raster ins finale OUTPUT schreiben,
-            # damit QGIS es automatisch lädt
-            saved = processing.run(
-                "gdal:translate",
-                {
-                    "INPUT": diff_raster,
-                    "TARGET_CRS": None,
-                    "NODATA": None,
-                    "COPY_SUBDATASETS": False,
-                    "OPTIONS": "",
-                    "EXTRA": "",
-                    "OUTPUT": parameters[self.OUTPUT_RASTER],
-                },
-                context=context,
-                feedback=feedback,
-                is_child_algorithm=True
-            )
-            return {self.OUTPUT_RASTER: saved["OUTPUT"]}
-
-
-        # 3) KEIN Vektorlayer: diff_raster auf finales OUTPUT schreiben (=> Auto-Laden)
-        saved = processing.run(
-            "gdal:translate",
-            {
-                "INPUT": diff_raster,
-                "TARGET_CRS": None,
-                "NODATA": None,
-                "COPY_SUBDATASETS": False,
-                "OPTIONS": "",
-                "EXTRA": "",
-                "OUTPUT": parameters[self.OUTPUT_RASTER],  # << finales Ziel
-            },
-            context=context,
-            feedback=feedback,
-            is_child_algorithm=True
-        )
-        return {self.OUTPUT_RASTER: saved["OUTPUT"]}
\ No newline at end of file
+                if feedback.isCanceled():
+                    gdal.GetDriverByName("GTiff").Delete(tmp_out)
+                    return {}
+                out = _finalize_output(tmp_out, calc_out)
+            except Exception as e:
+                feedback.pushInfo(f"NumPy streaming not possible ({e}); using the QGIS raster calculator.")
+                if os.path.exists(tmp_out):
+                    gdal.GetDriverByName("GTiff").Delete(tmp_out)
+
+            if out is None:
+                if int16_scale:
+                    feedback.pushWarning("Int16 precision is only available for the NumPy path; writing Float32.")
+                d = f'("{dom.name()}@1" - "{dgm.name()}@1")'
+                expr = f"if({d} < 0, 0, {d})"
+                layers = [dom, dgm]
+                if fb_polys is not None:
+                    mask_path = QgsProcessingUtils.generateTempFilename("fb_mask.tif")
+                    temp_paths.append(mask_path)
+                    _write_mask(_rasterize_mask(fb_polys[1], dgm.width(), dgm.height()), gt, dgm_crs.toWkt(), mask_path)
+                    mask_layer = QgsRasterLayer(mask_path, "fb_mask")
+                    if not mask_layer.isValid():
+                        raise QgsProcessingException("field block mask raster is invalid")
+                    expr = f'({expr}) * (1 - "{mask_layer.name()}@1")'
+                    layers.append(mask_layer)
+
+                out = processing.run(
+                        "native:rastercalc",
+                        {
+                            "LAYERS": layers,
+                            "EXPRESSION": expr,
+                            "EXTENT": dgm.extent(),
+                            "CRS": dgm.crs(),
+                            "OUTPUT": calc_out
+                        },
+                        context=context, feedback=feedback, is_child_algorithm=True
+                    )["OUTPUT"]
+
+            if as_vrt:
+                vrt = gdal.BuildVRT(out_path, [out])
+                if vrt is None:
+                    raise QgsProcessingException(f"VRT could not be written: {out_path}")
+                vrt = None
+                out = out_path
+            return {self.OUTPUT_RASTER: out}
+        finally:
+            dom = mask_layer = None  # Datei-Handles freigeben (Windows)
+            for p in temp_paths + (lazy_files if lazy_out is None else []):
+                _remove_temp(p)
+            if lazy_out is not None:
+                missing = _missing_vrt_sources(lazy_out)
+                if missing:
+                    raise QgsProcessingException(f"Lazy VRT references missing files: {', '.join(missing)}")
@@ -30,6 +30,7 @@ from qgis.core import (
     QgsProject,
     QgsCoordinateReferenceSystem,
     QgsUnitTypes,
+    QgsProcessingUtils,
 )
 from qgis.core import QgsApplication
 from qgis import processing
@@ -37,6 +38,289 @@ from osgeo import gdal, ogr
 import numpy as np
 import math
 import tempfile
+import threading
+import functools
+import contextlib
+import types
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    from scipy.ndimage import binary_dilation, binary_erosion
+except ImportError:  # SciPy is optional – NumPy morphology is used instead
+    binary_dilation = binary_erosion = None
+
+def _mask_gtiff_options(nbits=None):
+    """Creation options for the shadow masks: 512x512 tiles, ZSTD (DEFLATE if GDAL lacks it),
+    multi-threaded compression and SPARSE_OK, so tiles consisting only of the band NoData
+    (or only of 0 if no NoData is set) are not written. NoData must therefore be set before
+    WriteArray, since skipped tiles read back as the current NoData.
+
+    nbits packs Byte masks (1 or 2 bits per cell); the float predictor is used otherwise."""
+    co_list = gdal.GetDriverByName("GTiff").GetMetadataItem("DMD_CREATIONOPTIONLIST") or ""
+    comp = ["COMPRESS=ZSTD", "ZSTD_LEVEL=3"] if "ZSTD" in co_list else ["COMPRESS=DEFLATE", "ZLEVEL=6"]
+    bits = [f"NBITS={nbits}"] if nbits else ["PREDICTOR=3"]
+    return [
+        "TILED=YES", "BLOCKXSIZE=512", "BLOCKYSIZE=512",
+        *comp, *bits, "NUM_THREADS=ALL_CPUS",
+        "BIGTIFF=IF_SAFER", "SPARSE_OK=TRUE",
+    ]
+
+
+# GDAL-Einstellungen für die vielen Ausgabe-GeoTIFFs eines Laufs (danach wieder zurückgesetzt)
+_GDAL_CACHE_BYTES = 1024 * 1024 * 1024
+_GDAL_IO_CONFIG = {
+    "VSI_CACHE": "TRUE",
+    "GDAL_NUM_THREADS": "ALL_CPUS",
+}
+# nur beim Schreiben der Masken: kein Verzeichnis-Listing je Create. Nicht beim Lesen aktiv,
+# sonst ignoriert GDAL Begleitdateien (.aux.xml, .tfw, .prj) des DEM und der SAGA-Ergebnisse
+_GDAL_WRITE_CONFIG = {
+    "GDAL_DISABLE_READDIR_ON_OPEN": "EMPTY_DIR",
+}
+
+
+@contextlib.contextmanager
+def _gdal_config_options(options):
+    """Sets the given GDAL config options and restores the previous values afterwards."""
+    old_opts = {k: gdal.GetConfigOption(k) for k in options}
+    for k, v in options.items():
+        gdal.SetConfigOption(k, v)
+    try:
+        yield
+    finally:
+        for k, v in old_opts.items():
+            gdal.SetConfigOption(k, v)
+
+
+@contextlib.contextmanager
+def _gdal_io_config():
+    """Raises the GDAL block cache and sets _GDAL_IO_CONFIG for the duration of a run.
+
+    The previous values are restored afterwards, since GDAL settings are process-wide
+    and shared with QGIS. Whole-raster WriteArray calls (as in _write_shadow_mask)
+    bypass the block cache anyway on GDAL >= 3.5; the cache mainly helps reading.
+    """
+    old_cache = gdal.GetCacheMax()
+    if old_cache < _GDAL_CACHE_BYTES:
+        gdal.SetCacheMax(_GDAL_CACHE_BYTES)
+    try:
+        with _gdal_config_options(_GDAL_IO_CONFIG):
+            yield
+    finally:
+        gdal.SetCacheMax(old_cache)
+
+
+# everything except letters/digits (Unicode, like str.isalnum) and . - _ becomes "_" in file names
+_SLUG_RE = re.compile(r"[^\w.\-]")
+
+_SAGA_HILLSHADE = "sagang:analyticalhillshading"
+
+_MASK_NODATA_U8 = 3  # NoData of 2-bit masks (values 0/1)
+
+# Zeilen je Lesevorgang beim Laden des DEM (auf ein Vielfaches der Blockhöhe gerundet)
+_DEM_READ_ROWS = 256
+
+
+_K3 = np.ones((3, 3), dtype=bool)
+_K2 = np.ones((2, 2), dtype=bool)
+
+
+def _valid_cells(mask_nd):
+    """Flat indices of all non-NoData cells, computed once per DEM.
+
+    Only these cells are ordered into strips, so strips lying completely in NoData
+    (e.g. the borders of clipped LE rasters) never appear in the sweep.
+    """
+    flat = np.flatnonzero(~mask_nd.ravel())
+    # 4-Byte-Indizes halbieren den Speicherverkehr beim Sortieren/Gathern (Raster < 2^31 Zellen)
+    return flat.astype(np.int32 if mask_nd.size < 2**31 else np.int64, copy=False)
+
+
+def _strip_order(valid_flat, shape, dS_row, dS_col, dL_row, dL_col, strip_w):
+    """Orders the valid cells (see _valid_cells) by strip (perpendicular to the sun),
+    sunward -> lee within a strip.
+
+    Returns the flat cell indices in sweep order, their along-sun coordinate L and the
+    offsets at which each strip starts in that order (parallel arrays, no per-cell objects).
+    """
+    ny, nx = shape
+    ii, jj = np.divmod(valid_flat, nx)
+    # Zeilen-/Spaltenanteile einmal als 1D-Vektoren, pro Zelle nur noch nachschlagen + addieren
+    rows = np.arange(ny, dtype=np.float64)
+    cols = np.arange(nx, dtype=np.float64)
+    s = (rows * dS_row)[ii]
+    s += (cols * dS_col)[jj]
+    s /= strip_w
+    s_idx = np.rint(s, out=s).astype(np.int64)  # Streifenzahl kann bei fast achsparalleler Sonne groß werden
+    L = (rows * dL_row)[ii]
+    L += (cols * dL_col)[jj]
+    del ii, jj, s
+    order = np.lexsort((L, s_idx))  # stable: ties keep row-major order
+    flat = valid_flat[order]
+    L = L[order]
+    s_idx = s_idx[order]
+    del order
+    starts = np.flatnonzero(np.r_[True, s_idx[1:] != s_idx[:-1]]) if s_idx.size else np.zeros(0, np.int64)
+    return flat, L, starts
+
+
+def _sweep_strips(z, L, starts, tan_alt, eps_m, maxd, gap_max):
+    """Horizon sweep over cells in _strip_order order, all strips at once (segmented NumPy scans).
+
+    A cell is in shadow if the running horizon of the cells before it in its strip exceeds
+    its own T = z + tan_alt * d (d = distance from the strip's first cell). With maxd > 0 the
+    sweep of a strip stops after the first cell beyond maxd. Lit gaps of up to gap_max cells
+    between shadowed cells of a strip are closed afterwards. Returns a bool array.
+    """
+    n = L.size
+    if n == 0:
+        return np.zeros(0, dtype=bool)
+    seg = np.zeros(n, dtype=np.int64)
+    seg[starts[1:]] = 1
+    np.cumsum(seg, out=seg)
+    d = L - L[starts][seg]
+    T = z.astype(np.float64) + tan_alt * d
+
+    # segmentierter laufender Maximalwert: jeder Streifen wird über alle vorherigen angehoben
+    T -= T.min()
+    T += seg * (T.max() + 1.0)
+    prev = np.empty(n, dtype=np.float64)
+    prev[1:] = np.maximum.accumulate(T)[:-1]
+    prev[starts] = -np.inf
+    shadow = prev > T - eps_m
+    del prev, T
+
+    if maxd > 0:
+        over = d > maxd
+        prev_over = np.empty(n, dtype=bool)
+        prev_over[0] = False
+        prev_over[1:] = over[:-1]
+        prev_over[starts] = False
+        shadow &= ~over | ~prev_over  # bis einschließlich der ersten Zelle hinter maxd
+
+    # 1D-Closing entlang der Streifen: kurze besonnte Lücken zwischen Schattenzellen füllen
+    # (Lauflängen über die Wechsel Schatten <-> Sonne statt Zelle für Zelle)
+    if gap_max > 0:
+        change = np.diff(shadow.view(np.int8))
+        gap_start = np.flatnonzero(change == -1) + 1  # erste besonnte Zelle nach Schatten
+        gap_end = np.flatnonzero(change == 1)         # letzte besonnte Zelle vor Schatten
+        k = np.searchsorted(gap_end, gap_start)
+        has_end = k < gap_end.size
+        gap_start = gap_start[has_end]
+        gap_end = gap_end[k[has_end]]
+        keep = (gap_end - gap_start < gap_max) & (seg[gap_start - 1] == seg[gap_end + 1])
+        gap_start = gap_start[keep]
+        gap_end = gap_end[keep]
+        if gap_start.size:
+            delta = np.zeros(n + 1, dtype=np.int8)
+            delta[gap_start] = 1
+            delta[gap_end + 1] = -1
+            shadow |= np.cumsum(delta[:-1], dtype=np.int8).view(bool)
+    return shadow
+
+
+_prange = range  # replaced by numba.prange when the kernel is compiled
+
+
+def _sweep_strips_kernel(zflat, flat, L, starts, tan_alt, eps_m, maxd, gap_max, out):
+    """Per-strip horizon sweep and gap closing in one pass, writing into the flat shadow mask.
+
+    Same semantics as _sweep_strips; strips are independent, so they run in parallel (prange).
+
+    No early exit per strip: the rest of a strip is only certain to be shadowed once the
+    horizon exceeds the highest terrain still ahead plus tan_alt * remaining distance. Row/
+    column maxima as that bound almost never trigger on LE rasters, and the extra test per
+    cell made the sweep ~1.5x slower.
+    """
+    n = L.shape[0]
+    n_strips = starts.shape[0]
+    for s in _prange(n_strips):
+        a = starts[s]
+        b = starts[s + 1] if s + 1 < n_strips else n
+        L0 = L[a]
+        horizon = -1e38
+        for k in range(a, b):
+            d = L[k] - L0
+            T = zflat[flat[k]] + tan_alt * d
+            if horizon > T - eps_m:
+                out[flat[k]] = True
+            if T > horizon:
+                horizon = T
+            if maxd > 0 and d > maxd:
+                break
+        if gap_max > 0:
+            k = a
+            while k < b:
+                if out[flat[k]]:
+                    k += 1
+                    continue
+                g0 = k
+                while k < b and not out[flat[k]]:
+                    k += 1
+                if g0 > a and k < b and k - g0 <= gap_max:
+                    for t in range(g0, k):
+                        out[flat[t]] = True
+
+
+_SWEEP_KERNELS = {}  # parallel flag -> compiled kernel, False if numba is unavailable
+
+
+def _get_sweep_kernel(parallel=True):
+    """Imports numba and compiles _sweep_strips_kernel on first use (not at plugin load).
+
+    parallel=True spreads the strips over numba's threads (prange). When several rows are
+    computed in Python threads at once, the serial nogil variant is used instead: numba's
+    default threading layer must not be entered from several threads concurrently.
+    Returns None when numba is missing or compilation fails; the NumPy sweep is used then.
+    """
+    global _prange
+    key = bool(parallel)
+    if key not in _SWEEP_KERNELS:
+        _SWEEP_KERNELS[key] = False
+        try:
+            from numba import njit, prange
+        except ImportError:  # numba is optional
+            return None
+        _prange = prange
+        py_func = _sweep_strips_kernel
+        if not key:
+            # own qualname -> own on-disk cache entry, so the two variants never get mixed up
+            py_func = types.FunctionType(py_func.__code__, py_func.__globals__, "_sweep_strips_kernel_serial")
+            py_func.__qualname__ = "_sweep_strips_kernel_serial"
+        z = np.zeros(1, dtype=np.float32)
+        idx = np.zeros(1, dtype=np.int32)  # dtype of _valid_cells for grids < 2^31 cells
+        # no 'nnan'/'ninf' fastmath flags: the -1e38 horizon start must compare exactly
+        for cache in (True, False):  # plugin folder may be read-only -> retry without cache
+            try:
+                fn = njit(
+                    parallel=key, nogil=True, boundscheck=False, cache=cache,
+                    fastmath={"nsz", "arcp", "contract", "afn", "reassoc"},
+                )(py_func)
+                fn(z, idx, z.astype(np.float64), idx, 0.0, 0.0, 0.0, 0, np.zeros(1, dtype=np.bool_))
+                _SWEEP_KERNELS[key] = fn
+                break
+            except Exception:
+                continue
+    return _SWEEP_KERNELS[key] or None
+
+
+@functools.lru_cache(maxsize=32)
+def _infer_octants(az, tolerance_deg, min_parts, default_octants):
+    """Cached core of infer_octants_from_azimuths (az: tuple of floats, same table -> same result)."""
+    az = np.fromiter(az, dtype=np.float64, count=len(az))
+    az = np.unique(np.round(np.mod(az[~np.isnan(az)], 360.0), 6))  # unique() also sorts
+    n = len(az)
+    if n < min_parts:
+        return default_octants
+    diffs = np.diff(az, append=az[0] + 360.0)
+    mean_step = np.mean(diffs)
+    if mean_step <= 0:
+        return default_octants
+    max_dev = np.max(np.abs(diffs - mean_step))
+    if max_dev <= tolerance_deg and (350.0 <= np.sum(diffs) <= 370.0):
+        return int(round(360.0 / mean_step))
+    else:
+        return default_octants
 
 
 class TOOLBOX_2_HILLSHADES(QgsProcessingAlgorithm):
@@ -174,10 +458,7 @@ class TOOLBOX_2_HILLSHADES(QgsProcessingAlgorithm):
             return None
 
     def _slug(self, name):
-        out = []
-        for ch in (name or "").strip():
-            out.append(ch if (ch.isalnum() or ch in ".-_") else "_")
-        s = "".join(out).strip(" .")
+        s = _SLUG_RE.sub("_", (name or "").strip()).strip(" .")
         return s if s else "shadow"
 
     def _read_csv(self, path, col_name, col_az, col_alt, col_const):
@@ -235,17 +516,24 @@ class TOOLBOX_2_HILLSHADES(QgsProcessingAlgorithm):
         def pick(col):
             return fmap.get((col or "").lower(), col)
         cn, caz, calt, cconst = pick(col_name), pick(col_az), pick(col_alt), pick(col_const)
+        # Feldindizes einmal bestimmen, übrige Spalten beim Lesen gar nicht erst parsen
+        i_n, i_az, i_alt, i_c = (ld.GetFieldIndex(c) for c in (cn, caz, calt, cconst))
+        used = {cn, caz, calt, cconst}
+        lyr.SetIgnoredFields([name for name in fmap.values() if name not in used] + ["OGR_GEOMETRY", "OGR_STYLE"])
+
+        def field(feat, i):
+            return feat.GetField(i) if i != -1 else None
+
         lyr.ResetReading()
-        feat = lyr.GetNextFeature()
-        while feat:
+        for feat in lyr:
             rows.append({
-                "name":     feat.GetField(cn)      if feat.GetFieldIndex(cn)      != -1 else "",
-                "azimuth":  self._to_float(feat.GetField(caz)    if feat.GetFieldIndex(caz)    != -1 else None),
-                "altitude": self._to_float(feat.GetField(calt)   if feat.GetFieldIndex(calt)   != -1 else None),
-                "constant": self._to_float(feat.GetField(cconst) if feat.GetFieldIndex(cconst) != -1 else None),
+                "name":     field(feat, i_n) if i_n != -1 else "",
+                "azimuth":  self._to_float(field(feat, i_az)),
+                "altitude": self._to_float(field(feat, i_alt)),
+                "constant": self._to_float(field(feat, i_c)),
             })
-            feat = lyr.GetNextFeature()
-        ds.Destroy()
+        lyr = None
+        ds = None
         return rows
 
     def _read_table(self, table_path, sheet_name, col_name, col_az, col_alt, col_const):
@@ -258,60 +546,68 @@ class TOOLBOX_2_HILLSHADES(QgsProcessingAlgorithm):
 
     @staticmethod
     def infer_octants_from_azimuths(az_values, tolerance_deg=0.5, min_parts=4, default_octants=32):
-        import numpy as np
-        az = np.array([float(a) for a in az_values if a is not None and not np.isnan(a)], dtype=float)
-        az = np.mod(az, 360.0)  # [0,360)
-        az = np.unique(np.round(az, 6))
-        n = len(az)
-        if n < min_parts:
-            return default_octants
-        az_sorted = np.sort(az)
-        diffs = np.diff(az_sorted)
-        diffs = np.append(diffs, 360.0 - (az_sorted[-1] - az_sorted[0]))
-        mean_step = np.mean(diffs)
-        if mean_step <= 0:
-            return default_octants
-        max_dev = np.max(np.abs(diffs - mean_step))
-        if max_dev <= tolerance_deg and (350.0 <= np.sum(diffs) <= 370.0):
-            return int(round(360.0 / mean_step))
-        else:
-            return default_octants
+        az = tuple(float(a) for a in az_values if a is not None)
+        return _infer_octants(az, float(tolerance_deg), int(min_parts), int(default_octants))
 
     def _prepare_dem(self, dem_layer, feedback: QgsProcessingFeedback):
         src = dem_layer.source()
-        ds = gdal.Open(src, gdal.GA_ReadOnly)
+        # multi-threaded decompression for compressed GeoTIFFs (ignored by other drivers)
+        ds = gdal.OpenEx(src, gdal.OF_RASTER | gdal.OF_READONLY, open_options=["NUM_THREADS=ALL_CPUS"])
+        if ds is None:
+            ds = gdal.Open(src, gdal.GA_ReadOnly)
         if ds is None:
             raise QgsProcessingException("LE raster could not be opened.")
 
         band = ds.GetRasterBand(1)
-        Z = band.ReadAsArray()
-        if Z is None:
-            band = None
-            ds = None
-            raise QgsProcessingException("DEM band could not be read.")
-
-        Z = Z.astype(np.float32, copy=False)
+        ny, nx = ds.RasterYSize, ds.RasterXSize
+        gt = ds.GetGeoTransform()
+        proj = ds.GetProjection()
 
         nodata = band.GetNoDataValue()
         if nodata is None:
             nodata = -9999.0
         nodata = float(nodata)
 
-        mask_nd = ~np.isfinite(Z) | (Z == nodata)
-        Z[mask_nd] = np.nan  # allow NaN-based masking
-
-        gt = ds.GetGeoTransform()
-        proj = ds.GetProjection()
-        ny, nx = Z.shape
+        # Blockweise direkt in ein Float32-Grid lesen (an der Blockhöhe der Quelle ausgerichtet):
+        # keine Vollkopie im Quell-Datentyp, Masken je Block solange er noch im Cache liegt
+        block_h = max(1, band.GetBlockSize()[1])
+        step = block_h * max(1, _DEM_READ_ROWS // block_h)
+        Z = np.empty((ny, nx), dtype=np.float32)
+        mask_nd = np.empty((ny, nx), dtype=bool)
+        # Heights raster convention: LE > 0 (used for the class-5 rule of every output row)
+        mask_le = np.empty((ny, nx), dtype=bool)
+        for y0 in range(0, ny, step):
+            if feedback.isCanceled():
+                band = None
+                ds = None
+                raise QgsProcessingException("Aborted")
+            h = min(step, ny - y0)
+            zb = Z[y0:y0 + h]
+            if band.ReadAsArray(0, y0, nx, h, buf_obj=zb) is None:
+                band = None
+                ds = None
+                raise QgsProcessingException("DEM band could not be read.")
+            nd = mask_nd[y0:y0 + h]
+            np.isfinite(zb, out=nd)
+            np.logical_not(nd, out=nd)
+            nd |= zb == nodata
+            # Z bleibt roh (kein NaN-Patch): NoData steht in mask_nd, der Sweep liest nur gültige Zellen
+            le = mask_le[y0:y0 + h]
+            np.greater(zb, 0.0, out=le)
+            le[nd] = False
 
         band = None
         ds = None
 
-        feedback.pushInfo(f"DEM loaded once: {nx} x {ny} cells")
+        valid_flat = _valid_cells(mask_nd)
+        feedback.pushInfo(f"DEM loaded once: {nx} x {ny} cells ({valid_flat.size} valid)")
 
         return {
             "Z": Z,
             "mask_nd": mask_nd,
+            "mask_le": mask_le,
+            "valid_flat": valid_flat,
+            "scratch": threading.local(),  # per-thread shadow/morphology buffers
             "nodata": nodata,
             "gt": gt,
             "proj": proj,
@@ -323,8 +619,9 @@ class TOOLBOX_2_HILLSHADES(QgsProcessingAlgorithm):
         """Writes a Float32 GeoTIFF: shadow -> constant, sun -> 0, DEM no-data -> DEM nodata.
 
         Also enforces the 'LE pixels are always class 5' rule for const==5.
+        Pure masks (const==1) are written as packed Byte instead: 1 bit per cell, or 2 bits
+        with NoData 3 if the DEM has NoData cells.
         """
-        Z       = dem_info["Z"]
         mask_nd = dem_info["mask_nd"]
         nodata  = float(dem_info["nodata"])
         gt      = dem_info["gt"]
@@ -338,46 +635,79 @@ class TOOLBOX_2_HILLSHADES(QgsProcessingAlgorithm):
 
         shadow[mask_nd] = False
 
-        # Heights raster convention: LE > 0
-        mask_le = (~mask_nd) & np.isfinite(Z) & (Z > 0.0)
-
         c = float(const_val) if const_val is not None else 1.0
-        out = np.where(shadow, c, 0.0).astype(np.float32)
+        drv = gdal.GetDriverByName("GTiff")
 
-        # Enforce LE only for the class-5 raster
+        if abs(c - 1.0) < 1e-6:
+            has_nd = bool(mask_nd.any())
+            out_u8 = shadow.astype(np.uint8)
+            if has_nd:
+                out_u8[mask_nd] = _MASK_NODATA_U8
+            ods = drv.Create(
+                str(out_path), nx, ny, 1, gdal.GDT_Byte,
+                options=_mask_gtiff_options(nbits=2 if has_nd else 1),
+            )
+            if ods is None:
+                raise QgsProcessingException(f"Shadow mask could not be created: {out_path}")
+            ods.SetGeoTransform(gt)
+            ods.SetProjection(proj)
+            b = ods.GetRasterBand(1)
+            if has_nd:
+                b.SetNoDataValue(_MASK_NODATA_U8)  # vor dem Schreiben, wegen SPARSE_OK
+            b.WriteArray(out_u8)
+            b.FlushCache()
+            ods.FlushCache()
+            ods = None
+            return
+
+        # one float32 buffer, filled in place (no float64 temporary from np.where)
+        out = np.zeros((ny, nx), dtype=np.float32)
+        np.putmask(out, shadow, np.float32(c))
+
+        # Enforce LE only for the class-5 raster (LE mask is computed once in _prepare_dem)
         if abs(c - 5.0) < 1e-6:
-            out[mask_le] = 5.0
+            np.putmask(out, dem_info["mask_le"], np.float32(5.0))
 
-        out[mask_nd] = nodata
+        np.putmask(out, mask_nd, np.float32(nodata))
 
-        drv = gdal.GetDriverByName("GTiff")
         ods = drv.Create(
             str(out_path),
             nx,
             ny,
             1,
             gdal.GDT_Float32,
-            options=[
-                "TILED=YES",
-                "COMPRESS=DEFLATE",
-                "PREDICTOR=3",
-                "ZLEVEL=6",
-                "BIGTIFF=IF_SAFER",
-            ],
+            options=_mask_gtiff_options(),
         )
         ods.SetGeoTransform(gt)
         ods.SetProjection(proj)
         b = ods.GetRasterBand(1)
+        b.SetNoDataValue(nodata)  # vor dem Schreiben, wegen SPARSE_OK
         b.WriteArray(out)
-        b.SetNoDataValue(nodata)
         b.FlushCache()
         ods.FlushCache()
         ods = None
 
+    def _saga_input(self, dem_layer, feedback):
+        """Converts the DEM once into a native SAGA grid (.sdat) for all SAGA calls of a run.
+
+        SAGA loads its own format directly, so the rows do not decode the (compressed) source
+        raster again and again. Returns the .sdat path, or the layer itself if GDAL cannot write it.
+        """
+        path = QgsProcessingUtils.generateTempFilename("le_saga.sdat")
+        try:
+            ds = gdal.Translate(path, dem_layer.source(), format="SAGA", outputType=gdal.GDT_Float32)
+        except Exception:
+            ds = None
+        if ds is None:
+            return dem_layer
+        ds = None
+        feedback.pushInfo("DEM converted once to a SAGA grid for the SAGA runs.")
+        return path
+
     def _saga_shadow_mask(self, dem_layer, az, alt, context, feedback):
         """Runs SAGA 'Analytical Hillshading' with METHOD=3 ('Shadows Only') and returns a boolean mask."""
         res = processing.run(
-            "sagang:analyticalhillshading",
+            _SAGA_HILLSHADE,
             {
                 "ELEVATION": dem_layer,
                 "SHADE": QgsProcessing.TEMPORARY_OUTPUT,
@@ -421,8 +751,28 @@ class TOOLBOX_2_HILLSHADES(QgsProcessingAlgorithm):
         return ~nodata_mask
 
     @staticmethod
-    def _close_and_optionally_dilate(mask_bool, extra_dilate=False, kernel_size=3):
-        """Applies a 3x3 binary closing, optionally followed by an extra dilation (3x3 or 2x2)."""
+    def _close_and_optionally_dilate(mask_bool, extra_dilate=False, kernel_size=3, buf=None):
+        """Applies a 3x3 binary closing, optionally followed by an extra dilation (3x3 or 2x2).
+
+        Uses scipy.ndimage if available. Cells outside the raster count as set for the erosion,
+        so the closing does not eat shadows at the raster border. With buf (bool array of the
+        same shape) the SciPy path works without new grids: mask_bool and buf are overwritten
+        and the result is one of them.
+        """
+        if binary_dilation is not None:
+            src = np.asarray(mask_bool, dtype=bool)
+            a = buf if buf is not None else np.empty_like(src)
+            b = src if buf is not None else np.empty_like(src)
+            binary_dilation(src, structure=_K3, output=a)
+            binary_erosion(a, structure=_K3, border_value=1, output=b)
+            if not extra_dilate:
+                return b
+            if kernel_size == 2:
+                # 2x2 window covering the cell and its upper/left neighbours
+                binary_dilation(b, structure=_K2, origin=(-1, -1), output=a)
+            else:
+                binary_dilation(b, structure=_K3, output=a)
+            return a
 
         def _binary_dilate(m, k=3):
             ny_, nx_ = m.shape
@@ -440,7 +790,7 @@ class TOOLBOX_2_HILLSHADES(QgsProcessingAlgorithm):
             ]
             return np.logical_or.reduce(neigh)
 
-        m = np.array(mask_bool, dtype=bool, copy=False)
+        m = np.asarray(mask_bool, dtype=bool)
         d1 = _binary_dilate(m, k=3)
         e1 = ~_binary_dilate(~d1, k=3)
         m = e1
@@ -450,11 +800,29 @@ class TOOLBOX_2_HILLSHADES(QgsProcessingAlgorithm):
 
         return m
 
-    def _compute_shadow_octant(self, dem_info, az, alt, out_path, octants, maxd, edge_bias_px, feedback, const_val=1.0, fat_shadow=False, fat_kernel=3):
+    @staticmethod
+    def _row_workers(n_rows, n_cells):
+        """Threads for the internal scan: half the CPUs, limited by free RAM (~64 bytes/cell per row).
+
+        Threads rather than processes on purpose: the sweep (NumPy/nogil Numba) and GDAL writes
+        release the GIL, all rows share the one DEM in dem_info, and inside QGIS sys.executable is
+        the QGIS binary, so a ProcessPoolExecutor would have to re-import QGIS and reload the DEM
+        in every worker.
+        """
+        workers = max(1, min(n_rows, (os.cpu_count() or 2) // 2))
+        try:
+            import psutil
+            workers = max(1, min(workers, int(psutil.virtual_memory().available // (64 * max(1, n_cells)))))
+        except Exception:
+            pass
+        return workers
+
+    def _compute_shadow_octant(self, dem_info, az, alt, out_path, octants, maxd, edge_bias_px, feedback, const_val=1.0, fat_shadow=False, fat_kernel=3, parallel_kernel=True):
         """
         Shadow via strip-sweep in sun coordinates.
         Walks strips perpendicular to sun direction; in each strip, processes cells from sunward to lee.
-        Uses DEM already loaded in dem_info (no GDAL I/O here).
+        Uses DEM already loaded in dem_info (no GDAL reads here), writes out_path and returns
+        the final mask. The mask is a per-thread scratch grid, valid until the next call in this thread.
         """
         Z       = dem_info["Z"]
         mask_nd = dem_info["mask_nd"]
@@ -508,136 +876,59 @@ class TOOLBOX_2_HILLSHADES(QgsProcessingAlgorithm):
             ),
         )
 
-        # S-range from DEM corners
-        corners = [(0, 0), (0, nx - 1), (ny - 1, 0), (ny - 1, nx - 1)]
-        S_vals = [i * dS_row + j * dS_col for (i, j) in corners]
-        Smin, Smax = min(S_vals), max(S_vals)
-        s_idx_min = int(round(Smin / strip_w)) - 1
-        s_idx_max = int(round(Smax / strip_w)) + 1
-
-        shadow = np.zeros((ny, nx), dtype=bool)
-
-        total_strips = max(1, s_idx_max - s_idx_min + 1)
-        p_every = max(1, total_strips // 50)
-
         gap_max = int(self.__RAY_GAP_MAX) if self.__RAY_GAP_MAX is not None else 0
         if gap_max < 0:
             gap_max = 0
 
-        for si, s_idx in enumerate(range(s_idx_min, s_idx_max + 1)):
-            if feedback and feedback.isCanceled():
+        if feedback:
+            if feedback.isCanceled():
                 raise QgsProcessingException("Aborted")
 
-            cells_i = []
-            S_target = s_idx * strip_w
-            half_w = 0.5 * strip_w
-
-            for i in range(ny):
-                if abs(dS_col) > dir_eps:
-                    j_star = (S_target - i * dS_row) / dS_col
-                    j0 = max(0, int(math.floor(j_star - 1)))
-                    j1 = min(nx - 1, int(math.ceil(j_star + 1)))
-                    j_range = range(j0, j1 + 1)
-                else:
-                    S_row0 = i * dS_row
-                    if abs(S_row0 - S_target) > half_w:
-                        continue
-                    j_range = range(0, nx)
-
-                for j in j_range:
-                    S_ij = i * dS_row + j * dS_col
-                    if abs(S_ij - S_target) <= half_w:
-                        if not mask_nd[i, j]:
-                            L_ij = i * dL_row + j * dL_col
-                            cells_i.append((L_ij, i, j))
-
-            if not cells_i:
-                if feedback and (si % p_every == 0):
-                    feedback.setProgress(100.0 * si / float(total_strips))
-                continue
+        # all strips at once: order cells by strip and sunward -> lee, then sweep
+        # (Numba kernel parallel over strips if available, otherwise segmented NumPy scans)
+        flat, L, starts = _strip_order(dem_info["valid_flat"], (ny, nx), dS_row, dS_col, dL_row, dL_col, strip_w)
+        if feedback:
+            if feedback.isCanceled():
+                raise QgsProcessingException("Aborted")
 
-            # sort sunward -> lee
-            cells_i.sort(key=lambda t: t[0])
-
-            L0 = cells_i[0][0]
-            horizon = -1e38
-
-            # horizon-based classification
-            for (Lk, i, j) in cells_i:
-                d = (Lk - L0)
-                z = float(Z[i, j])
-                T = z + tan_alt * d
-                if horizon > T - eps_m:
-                    shadow[i, j] = True
-                if T > horizon:
-                    horizon = T
-                if maxd > 0 and d > maxd:
-                    break
-
-            # --- 1D closing along this strip: fill short lit gaps between shadow segments ---
-            if cells_i and gap_max > 0:
-                vals = [shadow[i, j] for (_, i, j) in cells_i]
-                n_vals = len(vals)
-                if n_vals >= 3:
-                    k = 0
-                    while k < n_vals:
-                        if vals[k]:
-                            k += 1
-                            continue
-                        # start of a run of False
-                        start = k
-                        while k < n_vals and not vals[k]:
-                            k += 1
-                        end = k - 1
-                        gap_len = end - start + 1
-                        left_true = (start - 1 >= 0 and vals[start - 1])
-                        right_true = (end + 1 < n_vals and vals[end + 1])
-                        if left_true and right_true and gap_len <= gap_max:
-                            for t in range(start, end + 1):
-                                vals[t] = True
-                    # write back
-                    for val, (_, i, j) in zip(vals, cells_i):
-                        shadow[i, j] = val
-
-            if feedback and (si % p_every == 0):
-                feedback.setProgress(100.0 * si / float(total_strips))
+        # Scratch-Grids pro Thread wiederverwenden statt je Zeile neu anzulegen
+        scratch = dem_info["scratch"]
+        shadow = getattr(scratch, "shadow", None)
+        if shadow is None:
+            shadow = scratch.shadow = np.zeros((ny, nx), dtype=bool)
+            scratch.morph = np.empty_like(shadow)
+        else:
+            shadow.fill(False)
+        kernel = _get_sweep_kernel(parallel_kernel)
+        if kernel is not None and flat.size:
+            kernel(Z.ravel(), flat, L, starts, float(tan_alt), float(eps_m), float(maxd), gap_max, shadow.ravel())
+        else:
+            shadow.ravel()[flat] = _sweep_strips(Z.ravel()[flat], L, starts, tan_alt, eps_m, maxd, gap_max)
+        del flat, L, starts
+        if feedback:
+            if feedback.isCanceled():
+                raise QgsProcessingException("Aborted")
 
         shadow[mask_nd] = False
 
-        # 3x3 morphological closing (2D) to fill remaining small holes
-        # --- helper: binary dilation with 3x3 or 2x2 kernel ----------------
-        def _binary_dilate(mask_bool, kernel_size=3):
-            ny_, nx_ = mask_bool.shape
-            padded = np.pad(mask_bool, 1, mode="constant", constant_values=False)
-
-            if kernel_size == 2:
-                # 2x2 kernel: OR over four 2x2 windows around each cell
-                a = padded[0:ny_,     0:nx_]
-                b = padded[0:ny_,     1:nx_+1]
-                c = padded[1:ny_+1,   0:nx_]
-                d = padded[1:ny_+1,   1:nx_+1]
-                return a | b | c | d
-            else:
-                # default: full 3x3 neighbourhood
-                neigh = [
-                    padded[0:-2, 0:-2], padded[0:-2, 1:-1], padded[0:-2, 2:],
-                    padded[1:-1, 0:-2], padded[1:-1, 1:-1], padded[1:-1, 2:],
-                    padded[2:,   0:-2], padded[2:,   1:-1], padded[2:,   2:],
-                ]
-                return np.logical_or.reduce(neigh)
-
-        d1 = _binary_dilate(shadow, kernel_size=3)
-        e1 = ~_binary_dilate(~d1, kernel_size=3)
-        shadow[:, :] = e1
-
+        # 3x3 morphological closing (2D) to fill remaining small holes,
         # optional extra dilation for 'fat' shadows
-        if fat_shadow:
-            shadow[:, :] = _binary_dilate(shadow, kernel_size=fat_kernel)
+        shadow = self._close_and_optionally_dilate(
+            shadow, extra_dilate=fat_shadow, kernel_size=fat_kernel, buf=scratch.morph
+        )
+        if feedback:
+            if feedback.isCanceled():
+                raise QgsProcessingException("Aborted")
 
         # Write output using DEM no-data mask and class-5 enforcement.
         self._write_shadow_mask(dem_info, shadow, out_path, const_val=const_val)
+        return shadow
 
     def processAlgorithm(self, parameters, context, feedback):
+        with _gdal_io_config():
+            return self._run(parameters, context, feedback)
+
+    def _run(self, parameters, context, feedback):
         self._EPS_M = None
 
         dem_layer = self.parameterAsRasterLayer(parameters, self.INPUT_DEM, context)
@@ -680,17 +971,12 @@ class TOOLBOX_2_HILLSHADES(QgsProcessingAlgorithm):
         feedback.pushInfo(f"Inferred octants: {octs}")
         self._OCTANTS = octs
 
-        created = []
         total_rows = len(rows)
         feedback.pushInfo("Rows: " + str(total_rows))
 
-        # If SAGA is missing or fails systematically, disable after the first hard failure
-        saga_enabled = bool(prefer_saga)
-
+        # Zeilen prüfen und Ausgabenamen festlegen
+        jobs = []
         for idx, row in enumerate(rows, start=1):
-            if feedback.isCanceled():
-                break
-
             name = (row.get("name") or "").strip()
             az   = self._to_float(row.get("azimuth"))
             alt  = self._to_float(row.get("altitude"))
@@ -702,67 +988,123 @@ class TOOLBOX_2_HILLSHADES(QgsProcessingAlgorithm):
             safe = self._slug(name)
             ctag = str(int(cval)) if float(cval).is_integer() else ("%g" % float(cval))
             fn = f"{prefix}{safe}{suffix}_sm_az{int(round(az))}_alt{int(round(alt))}_c{ctag}.tif"
-            out_path = os.path.join(out_dir, fn)
+            jobs.append((idx, name, float(az), float(alt), float(cval), os.path.join(out_dir, fn)))
 
-            feedback.pushInfo(f"[{idx}/{total_rows}] {name}: AZ={az}, ALT={alt}, CONST={cval} -> {fn}")
+        done = {}  # idx -> out_path
+        fallback = []  # job groups (one per sun position) for the internal scan
 
+        # SAGA-Verfügbarkeit einmal vorab prüfen statt an Fehlermeldungen je Zeile zu erkennen;
+        # nach dem ersten SAGA-Fehler laufen alle weiteren Zeilen über den internen Scan
+        saga_enabled = bool(prefer_saga)
+        if saga_enabled and QgsApplication.processingRegistry().algorithmById(_SAGA_HILLSHADE) is None:
+            feedback.pushInfo(f"'{_SAGA_HILLSHADE}' is not available – using the internal shadow scan.")
+            saga_enabled = False
+
+        # DEM einmal als SAGA-Grid ablegen, statt es bei jedem SAGA-Aufruf neu zu dekodieren
+        saga_dem = self._saga_input(dem_layer, feedback) if saga_enabled and jobs else dem_layer
+
+        # Zeilen mit gleicher Sonnenposition teilen sich eine Schattenmaske (nur CONST unterscheidet sich):
+        # je (AZ, ALT) wird einmal gerechnet und für jede Zeile der Gruppe geschrieben
+        groups = {}
+        for job in jobs:
+            groups.setdefault((job[2], job[3]), []).append(job)
+        if len(groups) < len(jobs):
+            feedback.pushInfo(f"{len(jobs)} rows share {len(groups)} sun positions")
+
+        # 1) SAGA seriell (processing.run ist nicht thread-sicher)
+        for (az, alt), group in groups.items():
+            if feedback.isCanceled():
+                break
+            if not saga_enabled:
+                fallback.append(group)
+                continue
             try:
-                if saga_enabled:
+                shadow_mask = self._saga_shadow_mask(saga_dem, az, alt, context, feedback)
+                # IMPORTANT:
+                # The plugin's own "Fat shadows" post-processing (closing + dilation)
+                # shall ONLY be applied to the internal fallback shadow-scan.
+                # When SAGA succeeds, we keep the SAGA result as-is.
+                with _gdal_config_options(_GDAL_WRITE_CONFIG):
+                    for idx, name, _, _, cval, out_path in group:
+                        if feedback.isCanceled():
+                            break
+                        feedback.pushInfo(f"[{idx}/{total_rows}] {name}: AZ={az}, ALT={alt}, CONST={cval} -> {os.path.basename(out_path)}")
+                        self._write_shadow_mask(dem_info, shadow_mask, out_path, const_val=cval)
+                        done[idx] = out_path
+            except Exception as saga_err:
+                names = ", ".join(f"'{job[1]}'" for job in group)
+                feedback.reportError(f"SAGA analytical hillshading failed for {names} (AZ={az}, ALT={alt}). Falling back to internal shadow scan. Details: {saga_err}")
+                saga_enabled = False
+                rest = [job for job in group if job[0] not in done]
+                if rest:
+                    fallback.append(rest)
+            feedback.setProgress(100.0 * len(done) / float(total_rows))
+
+        if isinstance(saga_dem, str):
+            try:
+                gdal.GetDriverByName("SAGA").Delete(saga_dem)
+            except Exception:
+                pass
+
+        # 2) interner Strip-Scan: Zeilen parallel im Thread-Pool (NumPy/GDAL/Numba geben den GIL frei)
+        if fallback and not feedback.isCanceled():
+            workers = self._row_workers(len(fallback), dem_info["nx"] * dem_info["ny"])
+            if workers > 1:
+                feedback.pushInfo(f"Internal shadow scan: {len(fallback)} sun positions on {workers} threads")
+
+            def _scan(group):
+                # abgebrochene Läufe: wartende Gruppen gar nicht erst beginnen
+                if feedback.isCanceled():
+                    raise QgsProcessingException("Aborted")
+                _, _, az, alt, cval, out_path = group[0]
+                shadow = self._compute_shadow_octant(
+                    dem_info,
+                    az,
+                    alt,
+                    out_path,
+                    octants=self._OCTANTS,
+                    maxd=self._MAX_DIST,
+                    edge_bias_px=self._EDGE_BIAS_PX,
+                    feedback=feedback,
+                    const_val=cval,
+                    fat_shadow=fat_shadow,
+                    fat_kernel=fat_kernel,
+                    parallel_kernel=(workers == 1),
+                )
+                for _, _, _, _, cval, out_path in group[1:]:
+                    if feedback.isCanceled():
+                        raise QgsProcessingException("Aborted")
+                    self._write_shadow_mask(dem_info, shadow, out_path, const_val=cval)
+
+            # the scan only works on dem_info in memory, so the pool only writes GeoTIFFs
+            with _gdal_config_options(_GDAL_WRITE_CONFIG), ThreadPoolExecutor(max_workers=workers) as ex:
+                futures = {ex.submit(_scan, group): group for group in fallback}
+                for fut in as_completed(futures):
+                    group = futures[fut]
                     try:
-                        shadow_mask = self._saga_shadow_mask(dem_layer, float(az), float(alt), context, feedback)
-                        # IMPORTANT:
-                        # The plugin's own "Fat shadows" post-processing (closing + dilation)
-                        # shall ONLY be applied to the internal fallback shadow-scan.
-                        # When SAGA succeeds, we keep the SAGA result as-is.
-                        self._write_shadow_mask(dem_info, shadow_mask, out_path, const_val=float(cval))
-                    except Exception as saga_err:
-                        feedback.reportError(f"SAGA analytical hillshading failed for '{name}' (AZ={az}, ALT={alt}). Falling back to internal shadow scan. Details: {saga_err}")
-                        # If the algorithm is not available (or SAGA provider is missing), stop trying for subsequent rows.
-                        msg = str(saga_err).lower()
-                        if "not found" in msg or "algorithm" in msg and "not" in msg and "found" in msg or "sagang" in msg:
-                            saga_enabled = False
-
-                        self._compute_shadow_octant(
-                            dem_info,
-                            float(az),
-                            float(alt),
-                            out_path,
-                            octants=self._OCTANTS,
-                            maxd=self._MAX_DIST,
-                            edge_bias_px=self._EDGE_BIAS_PX,
-                            feedback=feedback,
-                            const_val=float(cval),
-                            fat_shadow=fat_shadow,
-                            fat_kernel=fat_kernel,
-                        )
-                else:
-                    self._compute_shadow_octant(
-                        dem_info,
-                        float(az),
-                        float(alt),
-                        out_path,
-                        octants=self._OCTANTS,
-                        maxd=self._MAX_DIST,
-                        edge_bias_px=self._EDGE_BIAS_PX,
-                        feedback=feedback,
-                        const_val=float(cval),
-                        fat_shadow=fat_shadow,
-                        fat_kernel=fat_kernel,
-                    )
-                created.append(out_path)
-            except Exception as e:
-                feedback.reportError(f"Error '{name}': {e}")
-                continue
-
-            feedback.setProgress(100.0 * idx / float(total_rows))
-
-            if load_outputs and os.path.exists(out_path):
-                try:
-                    rlayer = QgsRasterLayer(out_path, os.path.splitext(os.path.basename(out_path))[0])
-                    if rlayer.isValid():
-                        QgsProject.instance().addMapLayer(rlayer)
-                except Exception:
-                    pass
+                        fut.result()
+                    except Exception as e:
+                        if not feedback.isCanceled():
+                            names = ", ".join(f"'{job[1]}'" for job in group)
+                            feedback.reportError(f"Error {names}: {e}")
+                    else:
+                        for idx, name, az, alt, cval, out_path in group:
+                            done[idx] = out_path
+                            feedback.pushInfo(f"[{idx}/{total_rows}] {name}: AZ={az}, ALT={alt}, CONST={cval} -> {os.path.basename(out_path)}")
+                    feedback.setProgress(100.0 * len(done) / float(total_rows))
+                    if feedback.isCanceled():
+                        for f in futures:
+                            f.cancel()
+
+        created = [done[i] for i in sorted(done)]
+
+        if load_outputs and not feedback.isCanceled():
+            # QGIS lädt die Raster nach Abschluss im UI-Thread (kein GDAL-Open je Datei hier)
+            for out_path in created:
+                details = QgsProcessingContext.LayerDetails(
+                    os.path.splitext(os.path.basename(out_path))[0], QgsProject.instance(), "OUTPUT_FILES"
+                )
+                context.addLayerToLoadOnCompletion(out_path, details)
 
         if not created:
             raise QgsProcessingException("No shadow masks were created.")
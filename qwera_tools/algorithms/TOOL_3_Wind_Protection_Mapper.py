@@ -6,6 +6,7 @@ Tool 3: Wind Protection Mapper
 """
 
 import re
+import fnmatch
 from pathlib import Path
 from typing import Dict, List, Iterable
 from qgis.PyQt.QtGui import QIcon
@@ -16,13 +17,149 @@ from qgis.core import (
     QgsProcessingParameterBoolean,
     QgsProcessingParameterString,
     QgsProcessingParameterFolderDestination,
+    QgsProcessingParameterNumber,
+    QgsProcessingParameterDefinition,
     QgsProcessingException,
     QgsProcessingContext,
     QgsProcessingFeedback,
 )
 from qgis.core import QgsProject
 from qgis import processing
+from osgeo import gdal
+import numpy as np
 import os
+import shutil
+from xml.sax.saxutils import escape
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+_CELLMAX_NODATA = -9999.0  # Standard-NoData von native:cellstatistics
+_READ_ROWS = 256
+_GDAL_TYPES = {
+    np.dtype(np.uint8): gdal.GDT_Byte,
+    np.dtype(np.uint16): gdal.GDT_UInt16,
+    np.dtype(np.int16): gdal.GDT_Int16,
+    np.dtype(np.uint32): gdal.GDT_UInt32,
+    np.dtype(np.int32): gdal.GDT_Int32,
+    np.dtype(np.float32): gdal.GDT_Float32,
+    np.dtype(np.float64): gdal.GDT_Float64,
+}
+
+
+def _gtiff_options(dtype):
+    """Tiled LZW GeoTIFF; horizontal predictor for integer classes, floating-point predictor otherwise."""
+    return [
+        "TILED=YES", "BLOCKXSIZE=256", "BLOCKYSIZE=256",
+        "COMPRESS=LZW", f"PREDICTOR={3 if dtype.kind == 'f' else 2}",
+        "NUM_THREADS=ALL_CPUS", "BIGTIFF=IF_SAFER",
+    ]
+
+
+def _group_max_vrt(in_paths, out_path, ignore_nodata):
+    """Writes the cell-wise maximum as a VRT with GDAL's built-in 'max' pixel function.
+
+    Nothing is computed here; GDAL evaluates the maximum when the VRT is read (e.g. by the
+    final merge). All inputs must share one grid. Needs GDAL >= 3.8 (max, propagateNoData).
+    """
+    ds = gdal.Open(str(in_paths[0]), gdal.GA_ReadOnly)
+    nx, ny = ds.RasterXSize, ds.RasterYSize
+    gt, proj = ds.GetGeoTransform(), ds.GetProjection()
+    ds = None
+    src_xml = []
+    for src in in_paths:
+        # Quell-NoData angeben: nur dann kommen NoData-Zellen als VRT-NoData bei der Pixelfunktion an
+        sds = gdal.Open(str(src), gdal.GA_ReadOnly)
+        nd = sds.GetRasterBand(1).GetNoDataValue()
+        sds = None
+        nd_xml = f"<NODATA>{nd!r}</NODATA>" if nd is not None else ""
+        src_xml.append(
+            f'    <ComplexSource><SourceFilename relativeToVRT="0">{escape(os.path.abspath(str(src)))}</SourceFilename>'
+            f"<SourceBand>1</SourceBand>"
+            f'<SrcRect xOff="0" yOff="0" xSize="{nx}" ySize="{ny}"/><DstRect xOff="0" yOff="0" xSize="{nx}" ySize="{ny}"/>'
+            f"{nd_xml}</ComplexSource>"
+        )
+    xml = (
+        f'<VRTDataset rasterXSize="{nx}" rasterYSize="{ny}">\n'
+        f"  <SRS>{escape(proj)}</SRS>\n"
+        f"  <GeoTransform>{', '.join(repr(float(g)) for g in gt)}</GeoTransform>\n"
+        f'  <VRTRasterBand dataType="Float32" band="1" subClass="VRTDerivedRasterBand">\n'
+        f"    <NoDataValue>{_CELLMAX_NODATA!r}</NoDataValue>\n"
+        f"    <PixelFunctionType>max</PixelFunctionType>\n"
+        f'    <PixelFunctionArguments propagateNoData="{"false" if ignore_nodata else "true"}"/>\n'
+        + "\n".join(src_xml) + "\n"
+        "  </VRTRasterBand>\n"
+        "</VRTDataset>\n"
+    )
+    with open(out_path, "w", encoding="utf-8") as fh:
+        fh.write(xml)
+    return str(out_path)
+
+
+def _cellmax_numpy(in_paths, out_path, ignore_nodata, is_canceled=None):
+    """Cell-wise maximum of rasters on one common grid, streamed in row blocks.
+
+    Same result as native:cellstatistics (STATISTIC=Maximum, NoData -9999) for identical
+    grids. Returns None if a raster cannot be opened or the grids differ; the caller
+    then falls back to native:cellstatistics, which also resamples.
+    """
+    datasets = [gdal.Open(str(p), gdal.GA_ReadOnly) for p in in_paths]
+    if any(ds is None for ds in datasets):
+        return None
+    ref = datasets[0]
+    nx, ny = ref.RasterXSize, ref.RasterYSize
+    gt = ref.GetGeoTransform()
+    for ds in datasets[1:]:
+        if (ds.RasterXSize, ds.RasterYSize) != (nx, ny) or not np.allclose(
+            ds.GetGeoTransform(), gt, rtol=0.0, atol=1e-6 * abs(gt[1])
+        ):
+            return None
+
+    bands = [ds.GetRasterBand(1) for ds in datasets]
+    nodata = [b.GetNoDataValue() for b in bands]
+    dtype = np.result_type(*[b.ReadAsArray(0, 0, 1, 1).dtype for b in bands])
+    if dtype.kind in "iu" and not (np.iinfo(dtype).min <= _CELLMAX_NODATA <= np.iinfo(dtype).max):
+        dtype = np.dtype(np.float32)
+    if dtype not in _GDAL_TYPES:
+        return None
+    low = -np.inf if dtype.kind == "f" else np.iinfo(dtype).min
+
+    ods = gdal.GetDriverByName("GTiff").Create(
+        str(out_path), nx, ny, 1, _GDAL_TYPES[dtype],
+        options=_gtiff_options(dtype),
+    )
+    if ods is None:
+        raise QgsProcessingException(f"Output raster could not be created: {out_path}")
+    ods.SetGeoTransform(gt)
+    ods.SetProjection(ref.GetProjection())
+    o_band = ods.GetRasterBand(1)
+    o_band.SetNoDataValue(_CELLMAX_NODATA)
+
+    block_h = max(1, bands[0].GetBlockSize()[1])
+    step = block_h * max(1, _READ_ROWS // block_h)
+    for y0 in range(0, ny, step):
+        if is_canceled is not None and is_canceled():
+            o_band = ods = None
+            gdal.GetDriverByName("GTiff").Delete(str(out_path))
+            return None
+        h = min(step, ny - y0)
+        acc = np.full((h, nx), low, dtype=dtype)
+        # ignore_nodata: Zelle gültig, sobald ein Raster einen Wert hat; sonst macht jedes NoData die Zelle ungültig
+        invalid = np.full((h, nx), ignore_nodata, dtype=bool)
+        for band, nd in zip(bands, nodata):
+            blk = band.ReadAsArray(0, y0, nx, h)
+            bad = np.isnan(blk) if blk.dtype.kind == "f" else np.zeros(blk.shape, dtype=bool)
+            if nd is not None:
+                bad |= blk == nd
+            np.maximum(acc, np.where(bad, low, blk).astype(dtype, copy=False), out=acc)
+            if ignore_nodata:
+                invalid &= bad
+            else:
+                invalid |= bad
+        acc[invalid] = _CELLMAX_NODATA
+        o_band.WriteArray(acc, 0, y0)
+
+    o_band.FlushCache()
+    o_band = ods = None
+    return str(out_path)
 
 class wind_protection_classes(QgsProcessingAlgorithm):
     # Parameter-Keys
@@ -32,8 +169,11 @@ class wind_protection_classes(QgsProcessingAlgorithm):
     IGNORE_NODATA = "IGNORE_NODATA"
     OUTPUT_DIR = "OUTPUT_DIR"
     OVERWRITE = "OVERWRITE"
+    THREADS = "THREADS"
+    GROUP_VRT = "GROUP_VRT"
 
-    # Regex: erste Zahl im Dateinamen
+    # Regex: erste Zahl im Dateinamen (einmal kompiliert; ein match() je Datei läuft komplett in C
+    # und ist schneller als ein Zeichen-Scan in Python)
     FIRST_NUMBER = re.compile(r"^[^\d]*(\d+)")
 
     def initAlgorithm(self, config=None):
@@ -72,6 +212,25 @@ class wind_protection_classes(QgsProcessingAlgorithm):
                 self.OVERWRITE, "Overwrite existing files", defaultValue=False
             )
         )
+        # Gruppen sind unabhängig -> parallel rechnen (je Gruppe ein native:cellstatistics)
+        p_threads = QgsProcessingParameterNumber(
+            self.THREADS,
+            "Groups computed in parallel",
+            type=QgsProcessingParameterNumber.Integer,
+            defaultValue=min(4, os.cpu_count() or 1),
+            minValue=1,
+        )
+        p_threads.setFlags(p_threads.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(p_threads)
+
+        # Gruppen-Maxima nur als VRT beschreiben; gerechnet wird erst beim Lesen (finaler Merge)
+        p_vrt = QgsProcessingParameterBoolean(
+            self.GROUP_VRT,
+            "Write group maxima as virtual rasters (.vrt, computed on read, GDAL >= 3.8)",
+            defaultValue=False,
+        )
+        p_vrt.setFlags(p_vrt.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(p_vrt)
 
     def icon(self):
     # Pfad relativ zu diesem Dateiordner
@@ -113,6 +272,7 @@ class wind_protection_classes(QgsProcessingAlgorithm):
             <li><b>Ignore NoData</b> — decides whether NoData cells participate in the cell-wise maximum calculation.</li>
             <li><b>Output folder</b> — destination directory for group and final rasters.</li>
             <li><b>Overwrite existing</b> — if enabled, existing results with identical names will be replaced.</li>
+            <li><b>Group maxima as VRT</b> (advanced) — writes <code>45_max.vrt</code> instead of <code>45_max.tif</code> for groups on a common grid; the maximum is computed by GDAL when the file is read (GDAL &ge; 3.8).</li>
             </ul></dt>
 
             <h2>Outputs</h2>
@@ -126,7 +286,7 @@ class wind_protection_classes(QgsProcessingAlgorithm):
             <dt><ul>
             <li>Input filenames must contain a leading number if grouping by numeric prefix is intended (e.g., r45a_hs_az45_alt36.tif  -> group prefix: 45).</li>
             <li>All rasters within a group should share the same grid geometry (extent, CRS, cell size).</li>
-            <li>The algorithm uses <code>STATISTIC = Maximum</code> (7) within <code>native:cellstatistics</code>.</li>
+            <li>Rasters on a common grid are combined directly (block-wise NumPy maximum); otherwise the algorithm uses <code>STATISTIC = Maximum</code> (7) within <code>native:cellstatistics</code>.</li>
             <li>ChatGPT was used to create this plugin.</li>
             <li>Tested with QGIS 3.44.x (Python 3.12, Windows).</li>
             </ul></dt>
@@ -136,20 +296,49 @@ class wind_protection_classes(QgsProcessingAlgorithm):
         return wind_protection_classes()
     # ---------- Hilfsfunktionen ----------
 
-    def _iter_files(self, root: Path, glob: str, recursive: bool) -> Iterable[Path]:
-        it = root.rglob(glob) if recursive else root.glob(glob)
-        for p in it:
-            if p.is_file():
-                yield p
-
-    def _group_by_first_number(self, files: Iterable[Path]) -> Dict[str, List[str]]:
+    def _iter_files(self, root: Path, glob: str, recursive: bool) -> Iterable[str]:
+        if "/" in glob or "\\" in glob:
+            # Muster mit Pfadanteil: pathlib-Semantik beibehalten
+            it = root.rglob(glob) if recursive else root.glob(glob)
+            for p in it:
+                if p.is_file():
+                    yield str(p)
+            return
+        # os.scandir liefert den Dateityp aus dem Verzeichniseintrag (kein stat() je Datei);
+        # Muster einmal übersetzen, normcase wie bei Path.glob (unter Windows ohne Groß/Klein)
+        match = re.compile(fnmatch.translate(os.path.normcase(glob))).match
+        stack = [str(root)]
+        while stack:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive:
+                            stack.append(entry.path)
+                    elif match(os.path.normcase(entry.name)) and entry.is_file():
+                        yield entry.path  # str aus scandir, kein Path-Objekt je Datei
+
+    def _group_by_first_number(self, files: Iterable[str]) -> Dict[str, List[str]]:
         groups: Dict[str, List[str]] = {}
         for f in files:
-            m = self.FIRST_NUMBER.match(f.stem)
-            key = m.group(1) if m else f.stem  # Fallback: kompletter Name, falls keine Zahl vorhanden
-            groups.setdefault(key, []).append(str(f))
+            stem = os.path.splitext(os.path.basename(f))[0]
+            m = self.FIRST_NUMBER.match(stem)
+            key = m.group(1) if m else stem  # Fallback: kompletter Name, falls keine Zahl vorhanden
+            groups.setdefault(key, []).append(f)
+            self._meta[f] = self._grid_key(f)
         return groups
 
+    @staticmethod
+    def _grid_key(path: str):
+        """Grid of a raster (size, geotransform, CRS), read once per file; None if GDAL cannot open it."""
+        ds = gdal.Open(path, gdal.GA_ReadOnly)
+        if ds is None:
+            return None
+        return (ds.RasterXSize, ds.RasterYSize, tuple(round(v, 9) for v in ds.GetGeoTransform()), ds.GetProjectionRef())
+
+    def _same_grid(self, paths: List[str]) -> bool:
+        keys = {self._meta.get(p) for p in paths}
+        return len(keys) == 1 and None not in keys
+
     def _schedule_load(self, context: QgsProcessingContext, output_path: str, layer_name: str, group_name: str):
         # Layer automatisch nach Abschluss laden
         details = QgsProcessingContext.LayerDetails(layer_name, QgsProject.instance(), group_name)
@@ -167,8 +356,14 @@ class wind_protection_classes(QgsProcessingAlgorithm):
         ignore_nodata = self.parameterAsBoolean(parameters, self.IGNORE_NODATA, context)
         out_dir = Path(self.parameterAsFileOutput(parameters, self.OUTPUT_DIR, context))
         overwrite = self.parameterAsBoolean(parameters, self.OVERWRITE, context)
+        group_vrt = self.parameterAsBoolean(parameters, self.GROUP_VRT, context)
+        if group_vrt and int(gdal.VersionInfo()) < 3080000:
+            feedback.pushInfo("Group VRTs need GDAL >= 3.8 – writing GeoTIFFs instead.")
+            group_vrt = False
         out_dir.mkdir(parents=True, exist_ok=True)
 
+        self._meta = {}  # Pfad -> Grid-Schlüssel, beim Gruppieren einmal je Datei gelesen
+
         # 1) Dateien finden
         files = list(self._iter_files(root, glob_pat, recursive))
         if not files:
@@ -183,29 +378,79 @@ class wind_protection_classes(QgsProcessingAlgorithm):
         group_title = "Maximum per group (first number)"
         keys = sorted(groups.keys(), key=lambda k: int(k) if k.isdigit() else k)
         total = len(keys)
-        group_outputs: list[str] = []
-
-        for i, key in enumerate(keys, start=1):
-            if feedback.isCanceled():
-                break
 
+        tasks = []
+        skipped = 0
+        for key in keys:
             in_list = groups[key]
             if len(in_list) < 2:
                 feedback.pushInfo(f"Group {key}: < 2 rasters – skipped.")
-                feedback.setProgress(100 * i / total)
+                skipped += 1
                 continue
 
             # schöner Outputname (Zahl ohne führende Nullen, sonst unverändert)
             key_print = int(key) if key.isdigit() else key
-            out_path = out_dir / f"{key_print}_max.tif"
+            ext = ".vrt" if group_vrt and self._same_grid(in_list) else ".tif"
+            out_path = out_dir / f"{key_print}_max{ext}"
 
             if out_path.exists() and not overwrite:
                 feedback.pushInfo(f"Skipping existing file (overwrite = No): {out_path.name}")
                 # Optional trotzdem laden:
                 self._schedule_load(context, str(out_path), out_path.stem, group_title)
-                feedback.setProgress(100 * i / total)
+                skipped += 1
                 continue
 
+            tasks.append((key, in_list, out_path))
+
+        feedback.setProgress(100 * skipped / total)
+        threads = max(1, min(self.parameterAsInt(parameters, self.THREADS, context), len(tasks) or 1))
+        if threads > 1:
+            feedback.pushInfo(f"{len(tasks)} groups on {threads} threads")
+
+        def _cellmax(task):
+            """VRT- oder NumPy-Maximum einer Gruppe; False, wenn native:cellstatistics nötig ist."""
+            key, in_list, out_path = task
+            if feedback.isCanceled():
+                return None
+            if out_path.suffix == ".vrt":
+                return _group_max_vrt(in_list, out_path, ignore_nodata)
+            # gleiches Grid in der Gruppe: direkt mit NumPy, sonst native:cellstatistics (resampelt)
+            if self._same_grid(in_list) and _cellmax_numpy(in_list, out_path, ignore_nodata, feedback.isCanceled) is not None:
+                return str(out_path)
+            return False
+
+        results = {}
+        # processing.run darf nicht aus Worker-Threads laufen → diese Gruppen danach seriell
+        serial = []
+        n_done = 0
+        with ThreadPoolExecutor(max_workers=threads) as ex:
+            futures = {ex.submit(_cellmax, task): task for task in tasks}
+            for fut in as_completed(futures):
+                if fut.cancelled():  # nach Abbruch nicht mehr gestartet – kein Fehler
+                    continue
+                task = futures[fut]
+                key, _, out_path = task
+                try:
+                    res = fut.result()
+                    if res is False:
+                        serial.append(task)
+                        continue
+                    if res is not None:
+                        results[key] = str(out_path)
+                        # self._schedule_load(context, str(out_path), out_path.stem, group_title)
+                        feedback.pushInfo(f"Gruppe {key} → {out_path.name}")
+                except Exception as e:
+                    feedback.reportError(f"Error in group {key}: {e}")
+
+                n_done += 1
+                feedback.setProgress(100 * (skipped + n_done) / total)
+                if feedback.isCanceled():
+                    for f in futures:
+                        f.cancel()
+
+        for key, in_list, out_path in sorted(serial, key=lambda t: keys.index(t[0])):
+            if feedback.isCanceled():
+                break
             params = {
                 "INPUT": in_list,
                 "STATISTIC": 7,              # 7 = Maximum
@@ -213,26 +458,39 @@ class wind_protection_classes(QgsProcessingAlgorithm):
                 "REFERENCE_LAYER": in_list[0],  # ← erstes Gruppen-Raster als Referenz
                 "OUTPUT": str(out_path),
             }
-
             try:
                 processing.run("native:cellstatistics", params, context=context, feedback=feedback)
-                # self._schedule_load(context, str(out_path), out_path.stem, group_title)
+                results[key] = str(out_path)
                 feedback.pushInfo(f"Gruppe {key} → {out_path.name}")
             except Exception as e:
+                if feedback.isCanceled():
+                    break
                 feedback.reportError(f"Error in group {key}: {e}")
+            n_done += 1
+            feedback.setProgress(100 * (skipped + n_done) / total)
 
-            feedback.setProgress(100 * i / total)
+        if feedback.isCanceled():
+            raise QgsProcessingException("Aborted")
 
-            group_outputs.append(str(out_path))
+        group_outputs: list[str] = [results[key] for key in keys if key in results]
+
+        if not group_outputs:
+            raise QgsProcessingException("No group maximum could be created.")
 
         final_max = str(out_dir / "wind_protection.tif")
-        processing.run("native:cellstatistics", {
-            "INPUT": group_outputs,
-            "STATISTIC":  7,  # 7 = Maximum
-            "IGNORE_NODATA": True,
-            "REFERENCE_LAYER": group_outputs[0],  # sicheres Grid
-            "OUTPUT": final_max
-        }, context=context, feedback=feedback)
+        if len(group_outputs) == 1 and not group_outputs[0].endswith(".vrt"):
+            # eine Gruppe: Maximum = Gruppenraster, Datei nur kopieren statt neu zu rechnen
+            shutil.copyfile(group_outputs[0], final_max)
+        elif _cellmax_numpy(group_outputs, final_max, True, feedback.isCanceled) is None:
+            if feedback.isCanceled():
+                raise QgsProcessingException("Aborted")
+            processing.run("native:cellstatistics", {
+                "INPUT": group_outputs,
+                "STATISTIC":  7,  # 7 = Maximum
+                "IGNORE_NODATA": True,
+                "REFERENCE_LAYER": group_outputs[0],  # sicheres Grid
+                "OUTPUT": final_max
+            }, context=context, feedback=feedback)
 
         self._schedule_load(context, str(final_max), Path(final_max).stem, "Group maximum")
         #schedule_load(context, final_max, Path(final_max).stem, "Gruppen-Max")
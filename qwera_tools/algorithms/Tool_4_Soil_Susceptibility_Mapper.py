@@ -24,9 +24,195 @@ from qgis.core import (
 from qgis import processing
 from qgis.PyQt.QtCore import QVariant
 from qgis.core import QgsVectorLayer, QgsField, edit
+from qgis.core import QgsProcessingUtils, QgsRasterFileWriter
+from qgis.analysis import QgsRasterCalculator, QgsRasterCalculatorEntry
+from osgeo import gdal
+import numpy as np
 import os
 from qgis.PyQt.QtGui import QIcon
 
+# Regeln nach Funk & Völker (2024): Zeile = Erodierbarkeit, Spalte = Windschutz (jeweils 0..5).
+# Kombinationen ohne Regel (Index 0) übernehmen die Erodierbarkeit, wie der else-Zweig des Ausdrucks.
+_SUSCEPTIBILITY_LUT = np.repeat(np.arange(6, dtype=np.float32)[:, None], 6, axis=1)
+_SUSCEPTIBILITY_LUT[1:, 1:] = [
+    [0, 0, 0, 0, 0],
+    [1, 0, 0, 0, 0],
+    [2, 1, 0, 0, 0],
+    [3, 2, 1, 0, 0],
+    [4, 3, 2, 1, 0],
+]
+
+# gleiche Regeln als Rasterrechner-Ausdruck (Fallback bei abweichendem Grid), A = Erodierbarkeit, B = Windschutz
+_SUSCEPTIBILITY_EXPR = """
+    if(A@1 = 1 AND B@1 >= 1 AND B@1 <= 5, 0,
+    if(A@1 = 2 AND B@1 = 1, 1,
+    if(A@1 = 2 AND B@1 >= 2 AND B@1 <= 5, 0,
+    if(A@1 = 3 AND B@1 = 1, 2,
+    if(A@1 = 3 AND B@1 = 2, 1,
+    if(A@1 = 3 AND B@1 >= 3 AND B@1 <= 5, 0,
+    if(A@1 = 4 AND B@1 = 1, 3,
+    if(A@1 = 4 AND B@1 = 2, 2,
+    if(A@1 = 4 AND B@1 = 3, 1,
+    if(A@1 = 4 AND B@1 >= 4 AND B@1 <= 5, 0,
+    if(A@1 = 5 AND B@1 = 1, 4,
+    if(A@1 = 5 AND B@1 = 2, 3,
+    if(A@1 = 5 AND B@1 = 3, 2,
+    if(A@1 = 5 AND B@1 = 4, 1,
+    if(A@1 = 5 AND B@1 = 5, 0,
+       A@1
+    )))))))))))))))
+"""
+
+_FLOAT32_NODATA = float(np.finfo(np.float32).min)  # -FLT_MAX, NoData of the QGIS raster calculator
+_READ_ROWS = 256
+
+
+def _susceptibility_block(e, p):
+    """Evaluates the raster-calculator rules for one block of erodibility/protection values."""
+    out = e.astype(np.float32)  # else-Zweig: Erodierbarkeit
+    e_int = (e == np.rint(e)) & (e >= 0) & (e <= 5)
+    p_int = (p == np.rint(p)) & (p >= 0) & (p <= 5)
+    lut = e_int & p_int
+    out[lut] = _SUSCEPTIBILITY_LUT[e[lut].astype(np.intp), p[lut].astype(np.intp)]
+    # nicht ganzzahliger Windschutz: nur die Bereichsregeln "erod = k AND protect >= k AND <= 5" (k = 1..4)
+    rng = e_int & ~p_int & (e >= 1) & (e <= 4) & (p >= e) & (p <= 5)
+    out[rng] = 0.0
+    return out
+
+
+_prange = range  # replaced by numba.prange when the kernel is compiled
+
+
+def _susceptibility_kernel(e, p, e_nd, p_nd, has_e_nd, has_p_nd, lut, nodata, out):
+    """Same rules as _susceptibility_block plus NoData, one pass per cell, rows in parallel."""
+    for i in _prange(e.shape[0]):
+        for j in range(e.shape[1]):
+            ev = e[i, j]
+            pv = p[i, j]
+            if ev != ev or pv != pv or (has_e_nd and ev == e_nd) or (has_p_nd and pv == p_nd):
+                out[i, j] = nodata
+                continue
+            r = ev
+            if ev >= 0 and ev <= 5 and ev == np.floor(ev):
+                if pv >= 0 and pv <= 5 and pv == np.floor(pv):
+                    r = lut[int(ev), int(pv)]
+                elif ev >= 1 and ev <= 4 and pv >= ev and pv <= 5:
+                    r = 0.0
+            out[i, j] = r
+
+
+_KERNEL = []  # [compiled kernel] or [None] once numba has been tried
+
+
+def _get_kernel():
+    """Imports numba and compiles _susceptibility_kernel on first use; None without numba."""
+    global _prange
+    if not _KERNEL:
+        _KERNEL.append(None)
+        try:
+            from numba import njit, prange
+        except ImportError:  # numba is optional
+            return None
+        _prange = prange
+        a = np.zeros((1, 1), dtype=np.float32)
+        for cache in (True, False):  # plugin folder may be read-only -> retry without cache
+            try:
+                fn = njit(parallel=True, nogil=True, boundscheck=False, cache=cache)(_susceptibility_kernel)
+                fn(a, a, np.float32(0), np.float32(0), False, False, _SUSCEPTIBILITY_LUT, np.float32(0), a.copy())
+                _KERNEL[0] = fn
+                break
+            except Exception:
+                continue
+    return _KERNEL[0]
+
+
+def _raster_calc(layers, out_path, extent, crs, width, height, transform_context, feedback):
+    """Evaluates _SUSCEPTIBILITY_EXPR with QgsRasterCalculator directly (no processing.run overhead)."""
+    entries = []
+    for ref, layer in zip(("A", "B"), layers):
+        entry = QgsRasterCalculatorEntry()
+        entry.ref = f"{ref}@1"
+        entry.raster = layer
+        entry.bandNumber = 1
+        entries.append(entry)
+    fmt = QgsRasterFileWriter.driverForExtension(os.path.splitext(out_path)[1].lstrip(".")) or "GTiff"
+    calc = QgsRasterCalculator(
+        _SUSCEPTIBILITY_EXPR, out_path, fmt, extent, crs, width, height, entries, transform_context
+    )
+    res = calc.processCalculation(feedback)
+    if int(res) != 0:  # 0 = Success
+        raise QgsProcessingException(calc.lastError() or f"error code {int(res)}")
+    return out_path
+
+
+def _nodata_mask(arr, nodata):
+    mask = np.isnan(arr)
+    if nodata is not None:
+        mask |= arr == nodata
+    return mask
+
+
+def _susceptibility_gdal(erod_src, protec_src, out_path, feedback):
+    """Computes the susceptibility raster block-wise with the lookup table.
+
+    Returns None (caller falls back to the raster calculator) if a source cannot be opened
+    with GDAL, the two grids differ or the output is not a GeoTIFF.
+    """
+    if os.path.splitext(out_path)[1].lower() not in (".tif", ".tiff"):
+        return None
+    e_ds = gdal.Open(erod_src, gdal.GA_ReadOnly)
+    p_ds = gdal.Open(protec_src, gdal.GA_ReadOnly)
+    if e_ds is None or p_ds is None:
+        return None
+    nx, ny = p_ds.RasterXSize, p_ds.RasterYSize
+    gt = p_ds.GetGeoTransform()
+    if (e_ds.RasterXSize, e_ds.RasterYSize) != (nx, ny) or not np.allclose(
+        e_ds.GetGeoTransform(), gt, rtol=0.0, atol=1e-6 * abs(gt[1])
+    ):
+        return None
+
+    e_band = e_ds.GetRasterBand(1)
+    p_band = p_ds.GetRasterBand(1)
+    e_nd = e_band.GetNoDataValue()
+    p_nd = p_band.GetNoDataValue()
+
+    ods = gdal.GetDriverByName("GTiff").Create(
+        out_path, nx, ny, 1, gdal.GDT_Float32,
+        options=["TILED=YES", "COMPRESS=LZW", "BLOCKXSIZE=256", "BLOCKYSIZE=256", "BIGTIFF=IF_SAFER"],
+    )
+    if ods is None:
+        raise QgsProcessingException(f"Output raster could not be created: {out_path}")
+    ods.SetGeoTransform(gt)
+    ods.SetProjection(p_ds.GetProjection())
+    o_band = ods.GetRasterBand(1)
+    o_band.SetNoDataValue(_FLOAT32_NODATA)
+
+    kernel = _get_kernel()
+    for y0 in range(0, ny, _READ_ROWS):
+        if feedback.isCanceled():
+            o_band = ods = None
+            gdal.GetDriverByName("GTiff").Delete(out_path)
+            raise QgsProcessingException("Aborted")
+        h = min(_READ_ROWS, ny - y0)
+        e = e_band.ReadAsArray(0, y0, nx, h).astype(np.float32, copy=False)
+        p = p_band.ReadAsArray(0, y0, nx, h).astype(np.float32, copy=False)
+        if kernel is not None:
+            out = np.empty((h, nx), dtype=np.float32)
+            kernel(
+                np.ascontiguousarray(e), np.ascontiguousarray(p),
+                np.float32(e_nd or 0), np.float32(p_nd or 0), e_nd is not None, p_nd is not None,
+                _SUSCEPTIBILITY_LUT, np.float32(_FLOAT32_NODATA), out,
+            )
+        else:
+            out = _susceptibility_block(e, p)
+            out[_nodata_mask(e, e_nd) | _nodata_mask(p, p_nd)] = _FLOAT32_NODATA
+        o_band.WriteArray(out, 0, y0)
+        feedback.setProgress(100.0 * (y0 + h) / ny)
+
+    o_band.FlushCache()
+    o_band = ods = None
+    return out_path
+
 class tool_4_susceptibility_of_soils_to_wind_erosion(QgsProcessingAlgorithm):
     INPUT_EROD = "INPUT_EROD"
     INPUT_PROTEC = "INPUT_PROTEC"
@@ -92,7 +278,7 @@ class tool_4_susceptibility_of_soils_to_wind_erosion(QgsProcessingAlgorithm):
             <h2>Notes</h2>
             <dt><ul>
             <li>Both inputs must share the same CRS. Otherwise, an error is raised.</li>
-            <li>The tool attempts <code>native:rastercalc</code> and falls back to <code>qgis:rastercalculator</code> when needed.</li>
+            <li>If both rasters share the same grid, the rules are applied directly as a lookup table (GeoTIFF output). Otherwise the tool runs the QGIS raster calculator (<code>QgsRasterCalculator</code>) and falls back to <code>qgis:rastercalculator</code> when needed.</li>
             <li>ChatGPT was used to create this plugin.</li>
             <li>Tested with QGIS 3.44.x (Python 3.12, Windows).</li>
             </ul></dt>
@@ -172,56 +358,40 @@ class tool_4_susceptibility_of_soils_to_wind_erosion(QgsProcessingAlgorithm):
         # Final erodibility map
         feedback.pushInfo("Step 2: Calculating final susceptibility of soils to wind erosion map…")
 
-        erod = f"\"{erod_layer.name()}@1\""  # dynamic, quoted layer name
-        protect = f"\"{protec_layer.name()}@1\""  # dynamic, quoted layer name
-
-        expr = f"""
-                 if({erod} = 1 AND {protect} >= 1 AND {protect} <= 5, 0,
-                 if({erod} = 2 AND {protect} = 1, 1, 
-                 if({erod} = 2 AND {protect} >= 2 AND {protect} <= 5, 0, 
-                 if({erod} = 3 AND {protect} = 1, 2, 
-                 if({erod} = 3 AND {protect} = 2, 1,
-                 if({erod} = 3 AND {protect} >= 3 AND {protect} <= 5, 0,
-                 if({erod} = 4 AND {protect} = 1, 3, 
-                 if({erod} = 4 AND {protect} = 2, 2,
-                 if({erod} = 4 AND {protect} = 3, 1, 
-                 if({erod} = 4 AND {protect} >= 4 AND {protect} <= 5, 0,
-                 if({erod} = 5 AND {protect} = 1, 4,
-                 if({erod} = 5 AND {protect} = 2, 3,
-                 if({erod} = 5 AND {protect} = 3, 2,
-                 if({erod} = 5 AND {protect} = 4, 1,
-                 if({erod} = 5 AND {protect} = 5, 0, 
-                        {erod}
-                     )))))))))))))))
-                 """
-
-        try:
-            out = processing.run(
-                "native:rastercalc",
-                {
-                    "LAYERS": [erod_layer, protec_layer],
-                    "EXPRESSION": expr,
-                    "EXTENT": rEXT,
-                    "CRS": rCRS,
-                    "OUTPUT": out_dst
-                },
-                context=context, feedback=feedback, is_child_algorithm=True
-            )["OUTPUT"]
-        except Exception as e:
-            feedback.reportError(f"native:rastercalc failed: {e}; falling back to qgis:rastercalculator …")
-            out = processing.run(
-                "qgis:rastercalculator",
-                {
-                    "EXPRESSION": expr.replace(erod_layer.name(), "A").replace(protec_layer.name(), "B").replace('"', ''),
-                    "LAYERS": [erod_layer, protec_layer],
-                    "CRS": rCRS,
-                    "EXTENT": rEXT,
-                    "WIDTH": rWIDTH,
-                    "HEIGHT": rHEIGHT,
-                    "OUTPUT": out_dst
-                },
-                context=context, feedback=feedback, is_child_algorithm=True
-            )["OUTPUT"]
+        # Lookup-Tabelle direkt auf den Rasterblöcken, wenn beide Raster dasselbe Grid haben
+        out = None
+        if out_dst != QgsProcessing.TEMPORARY_OUTPUT:
+            out = _susceptibility_gdal(erod_layer.source(), protec_layer.source(), out_dst, feedback)
+            if out is None:
+                feedback.pushInfo("Rasters differ in grid or format – using the raster calculator.")
+
+        if out is None:
+            # feste Namen A/B statt Anzeigenamen: Ausdruck ist konstant, kein Ersetzen im String
+            layers = [
+                QgsRasterLayer(erod_layer.source(), "A", erod_layer.providerType()),
+                QgsRasterLayer(protec_layer.source(), "B", protec_layer.providerType()),
+            ]
+
+            calc_dst = out_dst
+            if calc_dst == QgsProcessing.TEMPORARY_OUTPUT:
+                calc_dst = QgsProcessingUtils.generateTempFilename("susceptibility_of_soils_to_wind_erosion.tif")
+            try:
+                out = _raster_calc(layers, calc_dst, rEXT, rCRS, rWIDTH, rHEIGHT, context.transformContext(), feedback)
+            except Exception as e:
+                feedback.reportError(f"QgsRasterCalculator failed: {e}; falling back to qgis:rastercalculator …")
+                out = processing.run(
+                    "qgis:rastercalculator",
+                    {
+                        "EXPRESSION": _SUSCEPTIBILITY_EXPR,
+                        "LAYERS": layers,
+                        "CRS": rCRS,
+                        "EXTENT": rEXT,
+                        "WIDTH": rWIDTH,
+                        "HEIGHT": rHEIGHT,
+                        "OUTPUT": out_dst
+                    },
+                    context=context, feedback=feedback, is_child_algorithm=True
+                )["OUTPUT"]
         #------------------------------------------------------------------------------------------------
         if self.parameterAsBoolean(parameters, self.LOAD_OUTPUTS, context):
             context.addLayerToLoadOnCompletion(
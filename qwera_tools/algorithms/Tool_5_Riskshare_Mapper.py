@@ -8,14 +8,326 @@ from qgis.core import (
     QgsProcessingParameterVectorLayer, QgsProcessingParameterNumber,
     QgsProcessingParameterFeatureSink, QgsFeatureSink, QgsFeature, QgsFields,
     QgsField, QgsWkbTypes, QgsCoordinateTransform, QgsCoordinateReferenceSystem,
-    QgsProcessingContext, QgsProcessingFeedback, QgsVectorLayer, QgsRasterLayer
+    QgsProcessingContext, QgsProcessingFeedback, QgsVectorLayer, QgsRasterLayer,
+    QgsProcessingException, Qgis, QgsMemoryProviderUtils, QgsCsException,
+    QgsProcessingUtils, QgsFeatureRequest, QgsRectangle, QgsGeometry
 )
+from qgis.analysis import QgsRasterCalculator, QgsRasterCalculatorEntry
 from qgis.PyQt.QtCore import QVariant
 from qgis import processing
 from qgis.PyQt.QtGui import QIcon
 import os
+import itertools
+import math
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from osgeo import gdal, gdal_array, ogr
 from .geom_validity import check_and_fix_validity
 
+try:
+    import shapely
+    if not hasattr(shapely, "from_wkb"):  # Shapely < 2.0 has no vectorized API
+        shapely = None
+except ImportError:  # Shapely is optional – QgsGeometry.area() is used instead
+    shapely = None
+
+# Rasterdatentypen, bei denen das Zonal-Histogramm eine überschaubare Klassenzahl liefert
+_INT_TYPES = (
+    Qgis.DataType.Byte, Qgis.DataType.Int16, Qgis.DataType.UInt16,
+    Qgis.DataType.Int32, Qgis.DataType.UInt32,
+)
+_HISTO_PREFIX = "HISTO_"
+# Bis zu dieser Polygonzahl ist das fensterweise Lesen schneller als zonalstatisticsfb
+_GDAL_ZONAL_MAX_FEATURES = 500
+_MASK_NODATA = 255
+# Statistik-Layer wird nur einmal gelesen und direkt in den Sink geschrieben → Memory-Provider
+_STATS_OUTPUT = "memory:"
+_AREA_CHUNK = 5000  # Features je Thread-Block bei der Flächenberechnung
+_READ_ROWS = 256
+# Höchstens so viele Pixel je gelesenem Streifen eines Polygon-Fensters (GDAL-Zonalweg)
+_GDAL_WINDOW_PIXELS = 4_000_000
+
+
+def _histogram_columns(fields):
+    """Indizes/Klassenwerte der native:zonalhistogram-Spalten.
+
+    Liefert (Indizes ohne NoData, Klassenwerte als Array, alle Histogramm-Indizes).
+    """
+    cols, values, all_cols = [], [], []
+    for i, fld in enumerate(fields):
+        name = fld.name()
+        if not name.startswith(_HISTO_PREFIX):
+            continue
+        all_cols.append(i)
+        try:
+            values.append(float(name[len(_HISTO_PREFIX):]))
+        except ValueError:
+            continue  # HISTO_NODATA
+        cols.append(i)
+    return cols, np.asarray(values, dtype=np.float64), all_cols
+
+
+def _chunk_areas(feats):
+    # hasGeometry() zuerst: kein QgsGeometry-Wrapper für leere Features
+    return [f.geometry().area() if f.hasGeometry() else 0.0 for f in feats]
+
+
+def _shapely_areas(feats):
+    """Flächen über Shapely 2 (ein vektorisierter GEOS-Aufruf); None bei nicht lesbarem WKB."""
+    wkbs = [bytes(f.geometry().asWkb()) if f.hasGeometry() else None for f in feats]
+    try:
+        areas = shapely.area(shapely.from_wkb(wkbs))
+    except Exception:  # z. B. Kurvengeometrien, die GEOS nicht kennt
+        return None
+    return np.nan_to_num(np.asarray(areas, dtype=np.float64), nan=0.0)
+
+
+def _geometry_areas(feats, curved=False):
+    """Polygonflächen als float64-Array.
+
+    Mit Shapely 2 in einem vektorisierten Aufruf, sonst große Layer in Blöcken auf mehrere
+    Threads verteilt (die Geometrien werden nur gelesen, die sip-Aufrufe geben den GIL frei).
+    """
+    if shapely is not None and not curved:
+        areas = _shapely_areas(feats)
+        if areas is not None:
+            return areas
+    n = len(feats)
+    workers = min(os.cpu_count() or 1, n // _AREA_CHUNK)
+    if workers <= 1:
+        return np.asarray(_chunk_areas(feats), dtype=np.float64)
+    chunks = [feats[i:i + _AREA_CHUNK] for i in range(0, n, _AREA_CHUNK)]
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        parts = list(ex.map(_chunk_areas, chunks))
+    return np.fromiter(itertools.chain.from_iterable(parts), dtype=np.float64, count=n)
+
+
+def _native_threshold(dtype, threshold):
+    """Grenzwert im Datentyp des Rasters: ganzzahlig x ≥ t ⇔ x ≥ ceil(t).
+
+    So bleibt der Vergleich bei Byte/Int-Rastern ganzzahlig (kein Upcast auf float64).
+    Liefert None, wenn kein Wert des Typs den Grenzwert erreicht.
+    """
+    if dtype.kind not in "iu":
+        return threshold
+    info = np.iinfo(dtype)
+    t = math.ceil(threshold)
+    if t > info.max:
+        return None
+    return dtype.type(max(t, info.min))
+
+
+def _at_least(arr, thr):
+    if thr is None:
+        return np.zeros(arr.shape, dtype=bool)
+    return arr >= thr
+
+
+def _pixel_window(gt, width, height, rect):
+    """Pixelfenster (x0, y0, nx, ny) eines Rechtecks, nach außen aufs Raster-Gitter gerundet.
+
+    None, wenn das Rechteck das Raster nicht überlappt.
+    """
+    x0 = max(0, int(math.floor((rect.xMinimum() - gt[0]) / gt[1])))
+    x1 = min(width, int(math.ceil((rect.xMaximum() - gt[0]) / gt[1])))
+    ya, yb = sorted(((rect.yMaximum() - gt[3]) / gt[5], (rect.yMinimum() - gt[3]) / gt[5]))
+    y0 = max(0, int(math.floor(ya)))
+    y1 = min(height, int(math.ceil(yb)))
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def _threshold_mask_gdal(risk_rlayer, threshold, out_path, feedback, rect=None):
+    """0/1-Maske als Byte-GeoTIFF (NoData 255), blockweise gelesen.
+
+    1 Byte/Pixel statt Float32 → die Zonal-Statistik liest ein Viertel der Daten.
+    Mit rect (Ausdehnung der Feldblöcke) wird nur das überdeckte Raster-Fenster geschrieben.
+    Liefert None, wenn das Raster nicht direkt per GDAL lesbar ist (Fallback: QgsRasterCalculator).
+    """
+    if risk_rlayer.providerType() != "gdal":
+        return None
+    src = gdal.Open(risk_rlayer.source(), gdal.GA_ReadOnly)
+    if src is None:
+        return None
+    band = src.GetRasterBand(1)
+    nodata = band.GetNoDataValue()
+    gt = src.GetGeoTransform()
+    xoff, yoff, W, H = 0, 0, src.RasterXSize, src.RasterYSize
+    if rect is not None and gt[2] == 0 and gt[4] == 0 and gt[1] > 0:
+        xoff, yoff, W, H = _pixel_window(gt, W, H, rect) or (xoff, yoff, W, H)
+
+    dst = gdal.GetDriverByName("GTiff").Create(
+        out_path, W, H, 1, gdal.GDT_Byte,
+        options=["TILED=YES", "COMPRESS=LZW", "BIGTIFF=IF_SAFER"]
+    )
+    if dst is None:
+        return None
+    dst.SetGeoTransform((gt[0] + xoff * gt[1] + yoff * gt[2], gt[1], gt[2],
+                         gt[3] + xoff * gt[4] + yoff * gt[5], gt[4], gt[5]))
+    dst.SetProjection(src.GetProjection())
+    out_band = dst.GetRasterBand(1)
+    out_band.SetNoDataValue(_MASK_NODATA)
+
+    thr = _native_threshold(np.dtype(gdal_array.GDALTypeCodeToNumericTypeCode(band.DataType)), threshold)
+    for y0 in range(0, H, _READ_ROWS):
+        if feedback.isCanceled():
+            raise QgsProcessingException("Aborted")
+        h = min(_READ_ROWS, H - y0)
+        arr = band.ReadAsArray(xoff, yoff + y0, W, h)
+        mask = _at_least(arr, thr).view(np.uint8)
+        if arr.dtype.kind == "f":
+            mask[np.isnan(arr)] = _MASK_NODATA
+        if nodata is not None:
+            mask[arr == nodata] = _MASK_NODATA
+        out_band.WriteArray(mask, 0, y0)
+        feedback.setProgress(100.0 * (y0 + h) / H)
+    out_band.FlushCache()
+    dst = None
+    return out_path
+
+
+def _threshold_mask(risk_rlayer, threshold, out_path, transform_context, feedback, rect=None):
+    """0/1-Maske (Risiko ≥ Grenzwert) direkt mit QgsRasterCalculator, Band per Objekt gebunden."""
+    extent, width, height = risk_rlayer.extent(), risk_rlayer.width(), risk_rlayer.height()
+    if rect is not None:
+        pxw = risk_rlayer.rasterUnitsPerPixelX()
+        pxh = risk_rlayer.rasterUnitsPerPixelY()
+        gt = (extent.xMinimum(), pxw, 0.0, extent.yMaximum(), 0.0, -pxh)
+        win = _pixel_window(gt, width, height, rect)
+        if win is not None:
+            x0, y0, width, height = win
+            extent = QgsRectangle(
+                gt[0] + x0 * pxw, gt[3] - (y0 + height) * pxh,
+                gt[0] + (x0 + width) * pxw, gt[3] - y0 * pxh,
+            )
+    entry = QgsRasterCalculatorEntry()
+    entry.ref = "r@1"
+    entry.raster = risk_rlayer
+    entry.bandNumber = 1
+    calc = QgsRasterCalculator(
+        f"(r@1 >= {float(threshold)!r}) * 1", out_path, "GTiff",
+        extent, risk_rlayer.crs(),  # Raster-Gitter, sichert m²-Bezug
+        width, height, [entry], transform_context
+    )
+    res = calc.processCalculation(feedback)
+    if int(res) != 0:  # 0 = Success
+        raise QgsProcessingException(
+            f"Mask could not be created: {calc.lastError() or f'error code {int(res)}'}"
+        )
+    return out_path
+
+
+def _valid_pixels(arr, nodata):
+    """True für Pixel mit Wert (kein NaN, kein NoData)."""
+    valid = np.ones(arr.shape, dtype=bool)
+    if arr.dtype.kind == "f":
+        valid &= ~np.isnan(arr)
+    if nodata is not None:
+        valid &= arr != nodata
+    return valid
+
+
+def _window_strips(band, mem_drv, lyr, gt, win, all_touched=False):
+    """Liest ein Polygon-Fenster in Zeilenstreifen (höchstens _GDAL_WINDOW_PIXELS Pixel).
+
+    Liefert je Streifen (Zeilenoffset, Werte, Polygon-Maske); die Maske entsteht durch
+    Rastern des einen Polygons in lyr (Pixelmitte bzw. ALL_TOUCHED).
+    """
+    x0, y0, nx, ny = win
+    rows = max(1, min(ny, _GDAL_WINDOW_PIXELS // nx))
+    opts = ["ALL_TOUCHED=TRUE" if all_touched else "ALL_TOUCHED=FALSE"]
+    for r0 in range(0, ny, rows):
+        h = min(rows, ny - r0)
+        arr = band.ReadAsArray(x0, y0 + r0, nx, h)
+        mem = mem_drv.Create("", nx, h, 1, gdal.GDT_Byte)
+        mem.SetGeoTransform((gt[0] + x0 * gt[1], gt[1], 0.0, gt[3] + (y0 + r0) * gt[5], 0.0, gt[5]))
+        gdal.RasterizeLayer(mem, [1], lyr, burn_values=[1], options=opts)
+        inside = mem.GetRasterBand(1).ReadAsArray().view(bool)
+        mem = None
+        yield r0, arr, inside
+
+
+def _precise_counts(geom, band, mem_drv, lyr, gt, win, nodata, thr):
+    """Gewichtete Count/Summe über die exakte Schnittfläche Polygon ∩ Zelle.
+
+    Wie QgsZonalStatistics für Polygone, die höchstens eine Zellmitte enthalten: jede
+    berührte Zelle zählt mit dem überdeckten Flächenanteil.
+    """
+    x0, y0 = win[0], win[1]
+    cell_area = abs(gt[1] * gt[5])
+    count = total = 0.0
+    for r0, arr, touched in _window_strips(band, mem_drv, lyr, gt, win, all_touched=True):
+        valid = touched & _valid_pixels(arr, nodata)
+        high = _at_least(arr, thr)
+        for r, c in zip(*np.nonzero(valid)):
+            xa = gt[0] + (x0 + c) * gt[1]
+            ya = gt[3] + (y0 + r0 + r) * gt[5]
+            cell = QgsGeometry.fromRect(QgsRectangle(xa, ya + gt[5], xa + gt[1], ya))
+            a = geom.intersection(cell).area()
+            if a > 0:
+                w = min(a / cell_area, 1.0)
+                count += w
+                if high[r, c]:
+                    total += w
+    return count, total
+
+
+def _zonal_counts_gdal(risk_rlayer, vlayer, threshold, feedback):
+    """Count/Summe ≥ Grenzwert je Polygon über gelesene Rasterfenster.
+
+    Zählt wie zonalstatisticsfb nach Pixelmitte; liegt höchstens eine Zellmitte im Polygon,
+    wird wie dort nach exakter Schnittfläche gewichtet (_precise_counts). Große Fenster
+    werden in Zeilenstreifen gelesen.
+    Liefert {fid: (count, sum)} oder None, wenn das Raster nicht direkt per GDAL lesbar ist.
+    """
+    if risk_rlayer.providerType() != "gdal":
+        return None
+    ds = gdal.Open(risk_rlayer.source(), gdal.GA_ReadOnly)
+    if ds is None:
+        return None
+    gt = ds.GetGeoTransform()
+    if gt[2] != 0 or gt[4] != 0 or gt[1] <= 0:
+        return None  # gedrehte Raster → Standardweg
+    band = ds.GetRasterBand(1)
+    nodata = band.GetNoDataValue()
+    W, H = ds.RasterXSize, ds.RasterYSize
+
+    thr = _native_threshold(np.dtype(gdal_array.GDALTypeCodeToNumericTypeCode(band.DataType)), threshold)
+
+    mem_drv = gdal.GetDriverByName("MEM")
+    vds = ogr.GetDriverByName("Memory").CreateDataSource("")
+    lyr = vds.CreateLayer("poly", None, ogr.wkbUnknown)
+
+    out = {}
+    # nur Geometrie nötig, Attribute werden gar nicht erst gelesen
+    for f in vlayer.getFeatures(QgsFeatureRequest().setNoAttributes()):
+        if feedback.isCanceled():
+            raise QgsProcessingException("Aborted")
+        out[f.id()] = (0, 0)
+        if not f.hasGeometry():
+            continue
+        geom = f.geometry()
+        win = _pixel_window(gt, W, H, geom.boundingBox())
+        if win is None:
+            continue
+
+        ofeat = ogr.Feature(lyr.GetLayerDefn())
+        ofeat.SetGeometry(ogr.CreateGeometryFromWkb(bytes(geom.asWkb())))
+        lyr.CreateFeature(ofeat)
+        n_valid = n_high = 0
+        for _, arr, inside in _window_strips(band, mem_drv, lyr, gt, win):
+            vals = arr[inside & _valid_pixels(arr, nodata)]
+            n_valid += int(vals.size)
+            n_high += int(np.count_nonzero(_at_least(vals, thr)))
+        if n_valid <= 1:
+            # Polygon kleiner als (etwa) eine Zelle
+            n_valid, n_high = _precise_counts(geom, band, mem_drv, lyr, gt, win, nodata, thr)
+        lyr.DeleteFeature(ofeat.GetFID())
+        out[f.id()] = (n_valid, n_high)
+    return out
+
+
 class TOOLBOX_5_FeldbloeckeRiskShare(QgsProcessingAlgorithm):
     INPUT_RASTER = "INPUT_RASTER"
     INPUT_BLOCKS = "INPUT_BLOCKS"
@@ -146,18 +458,33 @@ class TOOLBOX_5_FeldbloeckeRiskShare(QgsProcessingAlgorithm):
         raster_crs = risk_rlayer.crs()
         if poly_vlayer.crs() != raster_crs:
             feedback.pushInfo("Reprojecting field blocks to raster CRS …")
-            reproj = processing.run(
-                "native:reprojectlayer",
-                {
-                    "INPUT": poly_vlayer,
-                    "TARGET_CRS": raster_crs,
-                    "OPERATION": "",
-                    "OUTPUT": "TEMPORARY_OUTPUT",
-                },
-                context=context,
-                feedback=feedback,
+            # Geometrien direkt in einen Memory-Layer transformieren (ein Batch-Insert)
+            xform = QgsCoordinateTransform(poly_vlayer.crs(), raster_crs, context.transformContext())
+            poly_proj = QgsMemoryProviderUtils.createMemoryLayer(
+                "blocks_reprojected", poly_vlayer.fields(), poly_vlayer.wkbType(), raster_crs
             )
-            poly_proj = reproj["OUTPUT"]
+            feats = []
+            failed = []  # wie native:reprojectlayer: Feature bleibt, aber ohne Geometrie
+            for f in poly_vlayer.getFeatures():
+                if feedback.isCanceled():
+                    raise QgsProcessingException("Aborted")
+                if f.hasGeometry():
+                    geom = f.geometry()
+                    try:
+                        geom.transform(xform)
+                        f.setGeometry(geom)
+                    except QgsCsException:
+                        failed.append(f.id())
+                        f.clearGeometry()
+                feats.append(f)
+            if failed:
+                shown = ", ".join(str(fid) for fid in failed[:20]) + (" …" if len(failed) > 20 else "")
+                feedback.pushWarning(
+                    f"{len(failed)} feature(s) could not be reprojected and are kept without geometry: {shown}"
+                )
+            if not poly_proj.dataProvider().addFeatures(feats):
+                raise QgsProcessingException("Reprojected field blocks could not be created.")
+            poly_proj.updateExtents()
         else:
             poly_proj = poly_vlayer
 
@@ -167,63 +494,97 @@ class TOOLBOX_5_FeldbloeckeRiskShare(QgsProcessingAlgorithm):
         feedback.pushInfo("Geometry fixed")
 
 
-        # 2) Binäre Maske: 1 wenn Risiko ≥ Grenzwert, sonst 0
-        feedback.pushInfo("Creating treshold mask (raster calculator) …")
+        if not isinstance(poly_proj, QgsVectorLayer):
+            poly_proj = QgsProcessingUtils.mapLayerFromString(poly_proj, context)
+
+        histo_cols = None
+        zonal_gdal = None
+        if poly_proj.featureCount() < _GDAL_ZONAL_MAX_FEATURES:
+            # Wenige Polygone: Fenster je Polygon lesen + rastern, kein Zwischenlayer
+            feedback.pushInfo("Computing zonal counts per polygon window (GDAL) …")
+            zonal_gdal = _zonal_counts_gdal(risk_rlayer, poly_proj, threshold, feedback)
+        if zonal_gdal is not None:
+            poly_with_stats = poly_proj
+        elif risk_rlayer.dataProvider().dataType(1) in _INT_TYPES:
+            # 2+3) Ganzzahlige Klassen: Zonal-Histogramm direkt auf dem Risiko-Raster,
+            # die Maske muss dann nicht erst geschrieben und wieder gelesen werden
+            feedback.pushInfo("Computing zonal histogram (count/sum ≥ threshold) …")
+            hist = processing.run(
+                "native:zonalhistogram",
+                {
+                    "INPUT_RASTER": risk_rlayer,
+                    "RASTER_BAND": 1,
+                    "INPUT_VECTOR": poly_proj,
+                    "COLUMN_PREFIX": _HISTO_PREFIX,
+                    "OUTPUT": _STATS_OUTPUT,
+                },
+                context=context,
+                feedback=feedback,
+            )
+            poly_with_stats = hist["OUTPUT"]
+            histo_cols = _histogram_columns(poly_with_stats.fields())
+        else:
+            # 2) Binäre Maske: 1 wenn Risiko ≥ Grenzwert, sonst 0
+            feedback.pushInfo("Creating treshold mask (raster calculator) …")
             # 2) Binäre Maske: 1 wenn Risiko ≥ Grenzwert, sonst 0 (QGIS-native)
-        
-        layer = f"\"{risk_rlayer.name()}@1\""  # dynamic, quoted layer name
-        expr = f"""{layer} >= {threshold} * 1"""
-
-        calc = processing.run(
-            "native:rastercalc",
-            {
-                "EXPRESSION": expr,
-                "LAYERS": [risk_rlayer],
-                "CRS": risk_rlayer.crs(),                 # sichert m- bzw. m²-Bezug
-                "EXTENT": risk_rlayer.extent(),           # exakt Raster-Extent
-                "OUTPUT": "TEMPORARY_OUTPUT",
-                # Optional (nur wenn du explizit setzen willst):
-                # "NODATA": 0,
-                # "OUTPUT_FORMAT": 1,  # GeoTIFF
-            },
-            context=context,
-            feedback=feedback,
-        )
-        mask_rlayer = QgsRasterLayer(calc["OUTPUT"], "highrisk_mask")
-        if not mask_rlayer.isValid():
-            raise QgsProcessingException("Mask (native) could not be created.")
-
-
-        # 3) Zonal Statistics über die Maske (Summe = Anzahl 1er-Zellen, Count = Anzahl Pixel)
-        feedback.pushInfo("Computing zonal statistics (sum/count) …")
-        # Ab QGIS 3.44 ist 'native:zonalstatisticsfb' die schnelle Variante
-        zonal = processing.run(
-            "native:zonalstatisticsfb",
-            {
-                "INPUT": poly_proj,
-                "INPUT_RASTER": mask_rlayer,
-                "RASTER_BAND": 1,
-                "COLUMN_PREFIX": "risk_",
-                "STATISTICS": [0, 1],  # 0=Count, 2=Sum
-                "OUTPUT":"TEMPORARY_OUTPUT"
-            },
-            context=context,
-            feedback=feedback,
-        )
-        poly_with_stats = zonal["OUTPUT"]
 
-        # 4) Felder für Fläche & Anteil ergänzen
+            mask_path = QgsProcessingUtils.generateTempFilename("highrisk_mask.tif")
+            # nur das von den Feldblöcken überdeckte Raster-Fenster rechnen
+            blocks_ext = poly_proj.extent()
+            if _threshold_mask_gdal(risk_rlayer, threshold, mask_path, feedback, blocks_ext) is None:
+                _threshold_mask(
+                    risk_rlayer, threshold, mask_path, context.transformContext(), feedback, blocks_ext
+                )
+            mask_rlayer = QgsRasterLayer(mask_path, "highrisk_mask")
+            if not mask_rlayer.isValid():
+                raise QgsProcessingException("Mask (native) could not be created.")
+
+            # 3) Zonal Statistics über die Maske (Summe = Anzahl 1er-Zellen, Count = Anzahl Pixel)
+            feedback.pushInfo("Computing zonal statistics (sum/count) …")
+            # Ab QGIS 3.44 ist 'native:zonalstatisticsfb' die schnelle Variante
+            zonal = processing.run(
+                "native:zonalstatisticsfb",
+                {
+                    "INPUT": poly_proj,
+                    "INPUT_RASTER": mask_rlayer,
+                    "RASTER_BAND": 1,
+                    "COLUMN_PREFIX": "risk_",
+                    # 0=Count, 1=Sum. Count bleibt: beide Werte entstehen im selben Durchlauf,
+                    # und Fläche/Pixelfläche wäre an Rändern und NoData-Zellen nicht exakt
+                    "STATISTICS": [0, 1],
+                    "OUTPUT": _STATS_OUTPUT,
+                },
+                context=context,
+                feedback=feedback,
+            )
+            poly_with_stats = zonal["OUTPUT"]
+
+        # 4) Zielschema: Eingangsfelder (+ risk_count/risk_sum) + Fläche & Anteil
         feedback.pushInfo("Calculating areas and shares …")
-        dp = poly_with_stats.dataProvider()
-        # Zusätzliche Felder
+        in_fields = poly_with_stats.fields()
+        if histo_cols is None:
+            fields_out = QgsFields(in_fields)
+            keep = None
+        else:
+            # Histogramm-Spalten sind nur Zwischenergebnis
+            skip = set(histo_cols[2])
+            fields_out = QgsFields()
+            keep = [i for i in range(in_fields.count()) if i not in skip]
+            for i in keep:
+                fields_out.append(in_fields.at(i))
         add_fields = [
             QgsField("area_m2", QVariant.Double),
             QgsField("area_high_m2", QVariant.Double),
             QgsField("pct_high", QVariant.Double),
             QgsField("thr_val", QVariant.Double),
         ]
-        dp.addAttributes(add_fields)
-        poly_with_stats.updateFields()
+        if histo_cols is not None or zonal_gdal is not None:
+            add_fields = [
+                QgsField("risk_count", QVariant.Double),
+                QgsField("risk_sum", QVariant.Double),
+            ] + add_fields
+        for fld in add_fields:
+            fields_out.append(fld)
 
         # Pixelgröße → Pixel-Fläche
         rdp = risk_rlayer.dataProvider()
@@ -231,39 +592,54 @@ class TOOLBOX_5_FeldbloeckeRiskShare(QgsProcessingAlgorithm):
         pxh = abs(risk_rlayer.rasterUnitsPerPixelY())
         pixel_area = pxw * pxh
 
-        # Feldindizes
-        idx_count = poly_with_stats.fields().indexOf("risk_count")
-        idx_sum = poly_with_stats.fields().indexOf("risk_sum")
-        idx_area = poly_with_stats.fields().indexOf("area_m2")
-        idx_high = poly_with_stats.fields().indexOf("area_high_m2")
-        idx_pct = poly_with_stats.fields().indexOf("pct_high")
-        idx_thr = poly_with_stats.fields().indexOf("thr_val")
-
-        changes = {}
-        for f in poly_with_stats.getFeatures():
-            geom = f.geometry()
-            total_area = geom.area() if geom is not None else 0.0
-            sum_high = f[idx_sum] if idx_sum != -1 and f[idx_sum] is not None else 0.0
-            # Summe der 1er-Zellen × Pixel-Fläche = Hochrisiko-Fläche
-            area_high = float(sum_high) * pixel_area if total_area > 0 else 0.0
-            pct = (area_high / total_area * 100.0) if total_area > 0 else 0.0
-
-            changes[f.id()] = {
-                idx_area: float(total_area),
-                idx_high: float(area_high),
-                idx_pct: float(pct),
-                idx_thr: float(threshold),
-            }
-
-        if changes:
-            dp.changeAttributeValues(changes)
+        idx_sum = in_fields.indexOf("risk_sum")
+        sum_from_field = histo_cols is None and zonal_gdal is None
+        has_sum = idx_sum != -1
+        histo_idx = histo_cols[0] if histo_cols is not None else None
+
+        # Ein Lesedurchlauf: Features bleiben im Speicher, Summe/Fläche vektorisiert
+        feats = list(poly_with_stats.getFeatures())
+        sums, histo = [], []
+        for f in feats:
+            if histo_idx is not None:
+                attrs = f.attributes()
+                histo.append([attrs[i] or 0 for i in histo_idx])
+            elif sum_from_field:
+                s_val = f.attribute(idx_sum) if has_sum else None
+                sums.append(s_val if s_val is not None else 0.0)
+
+        extra = []
+        if histo_cols is not None:
+            # Klassen-Zählungen (ohne NoData) → Count, Klassen ≥ Grenzwert → Summe
+            cols, values, _ = histo_cols
+            hist_arr = np.asarray(histo, dtype=np.float64).reshape(len(feats), len(cols))
+            counts = hist_arr.sum(axis=1)
+            sums = hist_arr[:, values >= threshold].sum(axis=1)
+            extra = [counts.tolist(), sums.tolist()]
+        elif zonal_gdal is not None:
+            cs = np.asarray([zonal_gdal[f.id()] for f in feats], dtype=np.float64).reshape(len(feats), 2)
+            counts, sums = cs[:, 0], cs[:, 1]
+            extra = [counts.tolist(), sums.tolist()]
+        sums = np.asarray(sums, dtype=np.float64)
+        areas = _geometry_areas(feats, QgsWkbTypes.isCurvedType(poly_with_stats.wkbType()))
+        has_area = areas > 0
+        # Summe der 1er-Zellen × Pixel-Fläche = Hochrisiko-Fläche
+        area_high = np.where(has_area, sums * pixel_area, 0.0)
+        pct = np.divide(area_high * 100.0, areas, out=np.zeros_like(areas), where=has_area)
+        thr = float(threshold)
+        thr_col = [thr] * len(feats)
 
         # 5) In Ziel-Sink schreiben (Shapefile)
-        fields_out: QgsFields = poly_with_stats.fields()
         (sink, dest_id) = self.parameterAsSink(
             params, self.OUTPUT, context, fields_out, poly_with_stats.wkbType(), poly_with_stats.crs()
         )
-        for f in poly_with_stats.getFeatures():
+        for f, *vals in zip(feats, *extra, areas.tolist(), area_high.tolist(), pct.tolist(), thr_col):
+            attrs = f.attributes()
+            if keep is not None:
+                attrs = [attrs[i] for i in keep]
+            # Feature trägt direkt das Zielschema, der Temp-Layer bleibt unverändert
+            f.setFields(fields_out, False)
+            f.setAttributes(attrs + vals)
             sink.addFeature(f, QgsFeatureSink.FastInsert)
 
         feedback.pushInfo("Done. Fields: risk_count, risk_sum, area_m2, area_high_m2, pct_high, thr_val")
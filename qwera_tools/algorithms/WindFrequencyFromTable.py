@@ -14,7 +14,7 @@ Wind Frequency Matrices from Generic Table (no station ID)
 Tested with QGIS 3.44.x (Python 3.12, Windows)
 """
 
-from qgis.PyQt.QtCore import QCoreApplication, QDateTime, QDate
+from qgis.PyQt.QtCore import QCoreApplication, QDateTime, QDate, QVariant
 from qgis.PyQt.QtGui import QIcon
 from qgis.core import (
     QgsProcessing,
@@ -33,8 +33,97 @@ from qgis.core import (
 import os
 import csv
 import math
+import warnings
 from datetime import datetime
 
+import numpy as np
+
+# Meteorological seasons: month index (0 = Jan) → season code → label
+_SEASON_NAMES = ("DJF", "MAM", "JJA", "SON")
+_SEASON_LUT = np.array([0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3, 0], dtype=np.int8)
+
+# Datetime string formats tried in this order (None = datetime.fromisoformat)
+_DT_FORMATS = (
+    None,
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%Y-%m-%d",
+    "%d.%m.%Y %H:%M:%S",
+    "%d.%m.%Y %H:%M",
+    "%d.%m.%Y",
+)
+
+_CSV_BUFFER = 1 << 20  # bytes
+
+_COMPASS = ("N", "NNE", "NE", "ENE", "E", "ESE", "SE", "SSE",
+            "S", "SSW", "SW", "WSW", "W", "WNW", "NW", "NNW")
+
+# fixed classes for the wind-rose plot (as in DWD tool)
+_PLOT_EDGES = (0.0, 3.0, 6.0, 9.0, 12.0, 15.0, 18.0, 20.0, float("inf"))
+
+_prange = range  # replaced by numba.prange when the kernel is compiled
+
+
+def _freq_kernel(ff, dd, width, edges, vmap, gid, counts):
+    """
+    Sector + speed class + count in one pass (same binning as _bin_indices for sorted limits).
+    counts: per-thread partial histograms [n_parts, n_groups, n_sect + 1, n_vclass];
+    samples with gid < 0 are skipped.
+    """
+    n = ff.shape[0]
+    n_parts = counts.shape[0]
+    last = edges.shape[0] - 1
+    step = (n + n_parts - 1) // n_parts
+    for t in _prange(n_parts):
+        for i in range(t * step, min(n, (t + 1) * step)):
+            g = gid[i]
+            if g < 0:
+                continue
+            d = dd[i] % 360.0
+            if d >= 360.0:
+                d = 0.0
+            k = int(d // width)
+            # searchsorted(edges, ff, side="right")
+            x = ff[i]
+            lo = 0
+            hi = last + 1
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if x < edges[mid]:
+                    hi = mid
+                else:
+                    lo = mid + 1
+            if lo == 0 or lo > last:
+                lo = last
+            v = vmap[lo]
+            counts[t, g, k, v] += 1
+
+
+_KERNEL = []  # [(compiled kernel, numba.get_num_threads)] or [None] once numba has been tried
+
+
+def _get_kernel():
+    """Imports numba and compiles _freq_kernel on first use; None without numba."""
+    global _prange
+    if not _KERNEL:
+        _KERNEL.append(None)
+        try:
+            from numba import njit, prange, get_num_threads
+        except ImportError:  # numba is optional – NumPy path is used instead
+            return None
+        _prange = prange
+        a = np.zeros(1, dtype=np.float64)
+        c = np.zeros((1, 1, 1, 1), dtype=np.int64)
+        for cache in (True, False):  # plugin folder may be read-only -> retry without cache
+            try:
+                fn = njit(parallel=True, nogil=True, boundscheck=False, cache=cache)(_freq_kernel)
+                fn(a, a, 360.0, a, np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.int64), c)
+                _KERNEL[0] = (fn, get_num_threads)
+                break
+            except Exception:
+                continue
+    return _KERNEL[0]
+
 
 class WindFrequencyFromTable(QgsProcessingAlgorithm):
     """
@@ -279,6 +368,15 @@ class WindFrequencyFromTable(QgsProcessingAlgorithm):
                         months.append(m)
         return sorted(set(months))
 
+    @staticmethod
+    def _to_float(val):
+        """float(val), or None for NULL/unparseable/NaN values."""
+        try:
+            x = float(val)
+        except Exception:
+            return None
+        return None if math.isnan(x) else x
+
     @staticmethod
     def _percentile_inc(values, p: float):
         """Inclusive percentile (linear interpolation), p in [0,1]."""
@@ -297,12 +395,11 @@ class WindFrequencyFromTable(QgsProcessingAlgorithm):
     @staticmethod
     def _write_csv(path, header, rows):
         os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, "w", newline="", encoding="utf-8") as f:
+        with open(path, "w", newline="", encoding="utf-8", buffering=_CSV_BUFFER) as f:
             # Use semicolon as delimiter (German locale-friendly)
             w = csv.writer(f, delimiter=";")
             w.writerow(header)
-            for r in rows:
-                w.writerow(r)
+            w.writerows(rows)
 
     @staticmethod
     def _sector_upper(dd, n_sect):
@@ -312,6 +409,11 @@ class WindFrequencyFromTable(QgsProcessingAlgorithm):
         width = 360.0 / n_sect
         # 0° belongs to first bin [0, width)
         k = int(dd // width)
+        return WindFrequencyFromTable._sector_edge(k, width)
+
+    @staticmethod
+    def _sector_edge(k, width):
+        """Upper edge (degrees) of sector index k."""
         upper = (k + 1) * width
         # cap numerical noise
         if upper > 360.0 and upper - 360.0 < 1e-9:
@@ -329,6 +431,131 @@ class WindFrequencyFromTable(QgsProcessingAlgorithm):
                 return hi
         return edges[-1]
 
+    @staticmethod
+    def _bin_indices(ff, dd, edges, n_sect):
+        """
+        Vectorized _sector_upper/_vclass_upper.
+        Returns (sector index k, index of the upper speed edge in edges) per sample;
+        sector upper edges for k = 0..n_sect come from _sector_edge.
+        """
+        width = 360.0 / n_sect
+        dd = np.mod(dd, 360.0)
+        dd[dd >= 360.0] = 0.0  # tiny negatives wrap to 360.0 → first sector, as in _sector_upper
+        # floor_divide has the same rounding as Python's // used by _sector_upper
+        sec_idx = np.floor_divide(dd, width).astype(np.int64)
+
+        e = np.asarray(edges, dtype=np.float64)
+        last = len(e) - 1
+        if last > 0 and np.all(e[1:] >= e[:-1]):
+            # half-open bins [edges[i], edges[i+1]) → upper edge index i+1
+            v_idx = np.searchsorted(e, ff, side="right")
+            v_idx[(v_idx == 0) | (v_idx > last)] = last
+        else:
+            # unsorted limits: first matching bin wins, like the linear scan in _vclass_upper
+            v_idx = np.full(ff.shape, last, dtype=np.int64)
+            todo = np.ones(ff.shape, dtype=bool)
+            for i in range(last):
+                hit = todo & (ff >= e[i]) & (ff < e[i + 1])
+                v_idx[hit] = i + 1
+                todo &= ~hit
+        return sec_idx, v_idx
+
+    @staticmethod
+    def _freq_counts(ff, dd, edges, n_sect, gid=None, labels=None, mask=None):
+        """
+        Histogram over (group, sector, speed class).
+        ff, dd: float arrays; gid: optional per-sample group index 0..len(labels)-1 of the
+        extra dimension, labels: group labels (e.g. months 1..12 or season names).
+        mask: optional bool array, only True samples are counted (no copy of ff/dd).
+        Returns (counts[n_groups, n_sect + 1, len(edges)], group labels).
+        """
+        n_k = n_sect + 1  # k == n_sect is possible through float rounding just below 360°
+        e = np.asarray(edges, dtype=np.float64)
+        n_v = len(e)
+
+        # repeated speed limits share one class (keyed by the edge value, as in _freq_long_plain)
+        _, first_i, inv = np.unique(e, return_index=True, return_inverse=True)
+        vmap = first_i[inv.reshape(-1)].astype(np.int64)
+
+        if gid is None:
+            g_idx = np.zeros(ff.shape, dtype=np.int64)
+            labels = [None]
+        else:
+            g_idx = gid.astype(np.int64, copy=False)
+            labels = list(labels)
+        if mask is not None:
+            g_idx = np.where(mask, g_idx, -1)
+        shape = (len(labels), n_k, n_v)
+
+        kernel = _get_kernel() if n_v > 1 and np.all(e[1:] >= e[:-1]) else None
+        if kernel is not None:
+            fn, get_num_threads = kernel
+            parts = max(1, min(get_num_threads(), ff.size))
+            counts = np.zeros((parts,) + shape, dtype=np.int64)
+            fn(
+                np.ascontiguousarray(ff, dtype=np.float64), np.ascontiguousarray(dd, dtype=np.float64),
+                360.0 / n_sect, e, vmap, g_idx, counts,
+            )
+            return counts.sum(axis=0), labels
+
+        sec_idx, v_idx = WindFrequencyFromTable._bin_indices(ff, dd, edges, n_sect)
+        flat = (g_idx * n_k + sec_idx) * n_v + vmap[v_idx]
+        if mask is not None:
+            flat = flat[mask]
+        counts = np.bincount(flat, minlength=len(labels) * n_k * n_v)
+        return counts.reshape(shape), labels
+
+    @staticmethod
+    def _freq_long_from_counts(hist, edges, n_sect, dim=None):
+        """
+        Long rows from a _freq_counts result.
+        Returns list of dicts: {dim?, sector, vclass, n, pct}
+        """
+        counts, labels = hist
+        _, n_k, n_v = counts.shape
+        width = 360.0 / n_sect
+        totals = counts.sum(axis=(1, 2))
+        counts = counts.reshape(-1)
+
+        # occupied cells in (group, sector, speed class) order
+        out = []
+        for c in np.flatnonzero(counts).tolist():
+            g, rest = divmod(c, n_k * n_v)
+            k, v = divmod(rest, n_v)
+            n = int(counts[c])
+            rec = {} if dim is None else {dim: labels[g]}
+            rec.update({
+                "sector": WindFrequencyFromTable._sector_edge(k, width),
+                "vclass": edges[v],
+                "n": n,
+                "pct": round(100.0 * n / (int(totals[g]) or 1), 6),
+            })
+            out.append(rec)
+        return out
+
+    @staticmethod
+    def _write_matrix_csv(path, hist, n_sect, edges, extra_dim=None):
+        """
+        Matrix CSV straight from a _freq_counts result (same layout as _freq_matrix_from_long_plain):
+        one row per occurring (extra_dim, vclass), one column per occurring sector, cells = n.
+        """
+        counts, labels = hist
+        width = 360.0 / n_sect
+        sec_upper = [WindFrequencyFromTable._sector_edge(k, width) for k in range(counts.shape[1])]
+
+        cols = sorted(np.flatnonzero(counts.sum(axis=(0, 2))).tolist(), key=sec_upper.__getitem__)
+        keys = sorted(
+            (labels[g], edges[v], g, v) for g, v in zip(*np.nonzero(counts.sum(axis=1)))
+        )
+        sub = counts[:, cols, :]
+
+        header = ([extra_dim] if extra_dim else []) + ["vclass"] + [str(sec_upper[k]) for k in cols]
+        rows = [
+            ([glabel] if extra_dim else []) + [vup] + sub[g, :, v].tolist()
+            for glabel, vup, g, v in keys
+        ]
+        WindFrequencyFromTable._write_csv(path, header, rows)
+
     @staticmethod
     def _freq_long_plain(rows, n_sect, edges, extra_dims=None):
         """
@@ -398,93 +625,146 @@ class WindFrequencyFromTable(QgsProcessingAlgorithm):
         return header, out_rows
 
     @staticmethod
-    def _parse_datetime_value(val, feedback):
-        """Try to convert various QGIS field types / strings to Python datetime."""
+    def _parse_datetime_value(val, order=None):
+        """
+        Try to convert various QGIS field types / strings to naive Python datetime
+        (timezone info is dropped to keep the wall-clock time for month/season).
+        order: optional list of indices into _DT_FORMATS; the matching format is moved
+        to the front so that a column with one consistent format parses on the first try.
+        """
         if val is None:
             return None
 
         # QDateTime
         if isinstance(val, QDateTime):
-            return val.toPyDateTime()
+            return val.toPyDateTime() if val.isValid() else None
 
         # QDate
         if isinstance(val, QDate):
-            return datetime(val.year(), val.month(), val.day(), 0, 0, 0)
+            return datetime(val.year(), val.month(), val.day(), 0, 0, 0) if val.isValid() else None
 
         # Already a datetime
         if isinstance(val, datetime):
-            return val
+            return val.replace(tzinfo=None)
 
-        # Fallback: parse string with several common formats
+        # Fallback: parse string with ISO first, then a few common patterns
         s = str(val).strip()
         if not s:
             return None
 
-        # Try ISO first
-        try:
-            return datetime.fromisoformat(s)
-        except Exception:
-            pass
-
-        # A few common patterns
-        fmts = [
-            "%Y-%m-%d %H:%M:%S",
-            "%Y-%m-%d %H:%M",
-            "%Y-%m-%d",
-            "%d.%m.%Y %H:%M:%S",
-            "%d.%m.%Y %H:%M",
-            "%d.%m.%Y",
-        ]
-        for fmt in fmts:
+        fmts = _DT_FORMATS
+        if order is None:
+            order = list(range(len(fmts)))
+        for k in order:
             try:
-                return datetime.strptime(s, fmt)
-            except Exception:
+                dt = datetime.fromisoformat(s) if fmts[k] is None else datetime.strptime(s, fmts[k])
+            except ValueError:
                 continue
-
-        feedback.reportError(f"Could not parse datetime value: '{s}'")
+            if k != order[0]:
+                order.remove(k)
+                order.insert(0, k)
+            return dt.replace(tzinfo=None)
         return None
-    
 
     @staticmethod
-    def _plot_windrose_png(rows, n_sect, out_png, feedback, period_str=None, title=None, out_dir=None, prefix=None):
+    def _parse_datetime_column(vals, feedback):
+        """
+        Convert a list of raw datetime attribute values to datetime64[s] (wall-clock time).
+        Values that cannot be parsed become NaT and are reported once, not per row.
+        """
+        vals = [None if v is None or (isinstance(v, QVariant) and v.isNull()) else v for v in vals]
+        n = len(vals)
+        secs = np.full(n, np.iinfo(np.int64).min, dtype=np.int64)  # int64 min == NaT
+        probe = next((v for v in vals if v is not None), None)
+
+        if isinstance(probe, QDateTime):
+            # seconds since epoch shifted by the UTC offset → local wall-clock time
+            ok = [i for i, v in enumerate(vals) if isinstance(v, QDateTime) and v.isValid()]
+            secs[ok] = [vals[i].toSecsSinceEpoch() + vals[i].offsetFromUtc() for i in ok]
+        elif isinstance(probe, str):
+            idx = [i for i, v in enumerate(vals) if isinstance(v, str) and v.strip()]
+            strs = np.array([vals[i].strip() for i in idx]) if idx else None
+            # plain ISO strings (no offset / "Z") → one C-level cast for the whole column
+            if strs is not None and np.char.str_len(strs).min() >= 10:
+                try:
+                    with warnings.catch_warnings():
+                        warnings.simplefilter("error")
+                        secs[idx] = strs.astype("datetime64[s]").astype(np.int64)
+                    idx = []
+                except (ValueError, Warning):
+                    pass
+            if idx:
+                order = list(range(len(_DT_FORMATS)))
+                dts = [WindFrequencyFromTable._parse_datetime_value(vals[i], order) for i in idx]
+                secs[idx] = np.array(dts, dtype="datetime64[s]").astype(np.int64)
+
+        # QDate, datetime or mixed column content
+        todo = np.flatnonzero(secs == np.iinfo(np.int64).min)
+        todo = [i for i in todo.tolist() if vals[i] is not None and not isinstance(vals[i], str)]
+        if todo:
+            dts = [WindFrequencyFromTable._parse_datetime_value(vals[i]) for i in todo]
+            secs[todo] = np.array(dts, dtype="datetime64[s]").astype(np.int64)
+
+        dt64 = secs.view("datetime64[s]")
+        bad = [i for i in np.flatnonzero(np.isnat(dt64)).tolist() if str(vals[i] or "").strip()]
+        if bad:
+            feedback.reportError(
+                f"Could not parse {len(bad)} datetime value(s), e.g. '{str(vals[bad[0]]).strip()}' "
+                "– these rows are skipped."
+            )
+        return dt64
+
+    @staticmethod
+    def _deg_to_compass(deg):
+        """16-point compass label for a direction in degrees."""
+        return _COMPASS[int(round(deg / 22.5)) % 16]
+
+    @staticmethod
+    def _plot_windrose_png_from_rows(rows, n_sect, out_png, feedback, **kwargs):
+        """Wind rose from row dicts (ff, dd) – aggregates with _freq_long_plain first."""
+        fr_long = WindFrequencyFromTable._freq_long_plain(rows, n_sect, list(_PLOT_EDGES), extra_dims=None)
+        width = 360.0 / n_sect
+        sec_upper = [WindFrequencyFromTable._sector_edge(k, width) for k in range(n_sect + 1)]
+        pct = np.zeros((len(sec_upper), len(_PLOT_EDGES)))
+        for r in fr_long:
+            pct[sec_upper.index(r["sector"]), _PLOT_EDGES.index(r["vclass"])] = r["pct"]
+        valid_ff = [r.get("ff") for r in rows if r.get("ff") is not None]
+        mean_ws = (sum(valid_ff) / len(valid_ff)) if valid_ff else float("nan")
+        WindFrequencyFromTable._plot_windrose_png(
+            pct, sec_upper, _PLOT_EDGES, mean_ws, n_sect, out_png, feedback, **kwargs
+        )
+
+    @staticmethod
+    def _plot_windrose_png(pct, sec_upper, vclass_upper, mean_ws, n_sect, out_png, feedback,
+                           period_str=None, title=None, out_dir=None, prefix=None):
+        """
+        pct: frequency (%) per sector index × speed class, shape (len(sec_upper), len(vclass_upper)),
+        e.g. from _freq_counts with _PLOT_EDGES; mean_ws: mean wind speed for the stats box.
+        """
         import math as _math
         import matplotlib.pyplot as plt
 
-        # fixed classes for plotting (as in DWD tool)
-        plot_edges = [0.0, 3.0, 6.0, 9.0, 12.0, 15.0, 18.0, 20.0, float("inf")]
-        fr_long = WindFrequencyFromTable._freq_long_plain(rows, n_sect, plot_edges, extra_dims=None)
-        if not fr_long:
+        if not pct.any():
             return
 
         width = 2 * _math.pi / n_sect
-        sectors = sorted({r["sector"] for r in fr_long})
-        vclasses = sorted({r["vclass"] for r in fr_long})
-
-        M = {s: {vc: 0.0 for vc in vclasses} for s in sectors}
-        for r in fr_long:
-            M[r["sector"]][r["vclass"]] = r["pct"]
+        # occurring speed classes, ascending
+        vcols = sorted(np.flatnonzero(pct.any(axis=0)).tolist(), key=lambda v: vclass_upper[v])
+        vclasses = [vclass_upper[v] for v in vcols]
 
         theta = [_math.radians((360.0 / n_sect) * i + (360.0 / n_sect) / 2) for i in range(n_sect)]
-        sectors_ordered = [round((i + 1) * (360.0 / n_sect), 6) for i in range(n_sect)]
 
-        try:
-            import numpy as _np
-            bottoms = _np.zeros(len(theta))
-        except Exception:
-            bottoms = [0.0] * len(theta)
+        bottoms = np.zeros(n_sect)
 
         fig = plt.figure(figsize=(7, 7))
         ax = plt.subplot(111, polar=True)
         ax.set_theta_zero_location("N")
         ax.set_theta_direction(-1)
 
-        for vc in vclasses:
-            vals = [M[s].get(vc, 0.0) for s in sectors_ordered]
+        for v in vcols:
+            vals = pct[:n_sect, v]
             ax.bar(theta, vals, width=width, bottom=bottoms, align="center")
-            try:
-                bottoms = [b + v for b, v in zip(bottoms, vals)]
-            except Exception:
-                pass
+            bottoms += vals
 
         ax.set_title(title or "Wind rose (frequency %) — full dataset", va="bottom", y=1.10, fontsize=12)
 
@@ -515,26 +795,12 @@ class WindFrequencyFromTable(QgsProcessingAlgorithm):
         leg.get_title().set_fontsize(10)
 
         # stats box: mean speed + peak direction
-        valid_ff = [r.get("ff") for r in rows if r.get("ff") is not None]
-        mean_ws = (sum(valid_ff) / len(valid_ff)) if valid_ff else float("nan")
+        sector_sum = pct.sum(axis=1)
+        peak_sector = sec_upper[int(np.argmax(sector_sum))]
 
-        sector_sum = {}
-        for rr in fr_long:
-            s = rr.get("sector")
-            sector_sum[s] = sector_sum.get(s, 0.0) + float(rr.get("pct", 0.0) or 0.0)
-        peak_sector = max(sector_sum, key=sector_sum.get) if sector_sum else None
-
-        def deg_to_compass(deg):
-            dirs = ["N","NNE","NE","ENE","E","ESE","SE","SSE","S","SSW","SW","WSW","W","WNW","NW","NNW"]
-            ix = int(round(deg / 22.5)) % 16
-            return dirs[ix]
-
-        if peak_sector is not None:
-            sector_width_deg = 360.0 / n_sect
-            center_deg = (peak_sector - sector_width_deg / 2.0) % 360.0
-            peak_dir_label = deg_to_compass(center_deg)
-        else:
-            peak_dir_label = "n/a"
+        sector_width_deg = 360.0 / n_sect
+        center_deg = (peak_sector - sector_width_deg / 2.0) % 360.0
+        peak_dir_label = WindFrequencyFromTable._deg_to_compass(center_deg)
 
         stats_text = f"Mean speed: {mean_ws:.2f} m/s\nPeak direction: {peak_dir_label}"
         ax.text(
@@ -642,82 +908,69 @@ class WindFrequencyFromTable(QgsProcessingAlgorithm):
             want_sea_long = want_sea_matrix = False
             want_cus_long = want_cus_matrix = False
 
-        # ---- Build time series (ts) from table ----
-        ts = []
-        feats = vl.getFeatures(QgsFeatureRequest())
+        # ---- Read table into column arrays (ff, dd, dt64) ----
+        fields = vl.fields()
+        idx_ff = fields.indexOf(field_speed)
+        idx_dd = fields.indexOf(field_dir)
+        idx_dt = fields.indexOf(field_dt) if have_dt else -1
+        if idx_ff < 0 or idx_dd < 0 or (have_dt and idx_dt < 0):
+            raise QgsProcessingException("Selected field(s) not found in the input table.")
+
+        # only the needed columns, no geometry
+        req = QgsFeatureRequest().setSubsetOfAttributes(
+            [idx_ff, idx_dd] + ([idx_dt] if have_dt else [])
+        ).setFlags(QgsFeatureRequest.NoGeometry)
+        feats = vl.getFeatures(req)
         total_feats = vl.featureCount() or 0
         processed = 0
 
         feedback.pushInfo("Reading table and building time series …")
 
+        ff_list, dd_list, dt_list = [], [], []
+        to_float = self._to_float
         for f in feats:
             processed += 1
             if total_feats and processed % 1000 == 0:
                 feedback.setProgress(int(100.0 * processed / total_feats))
 
-            # Datetime (optional)
-            if have_dt:
-                dt_val = f[field_dt]
-                dt = self._parse_datetime_value(dt_val, feedback)
-                if dt is None:
-                    continue
-            else:
-                dt = None
-
-            # Speed
-            try:
-                ff_val = f[field_speed]
-                ff = float(ff_val) if ff_val is not None else None
-            except Exception:
-                ff = None
-
-            # Direction
-            try:
-                dd_val = f[field_dir]
-                dd = float(dd_val) if dd_val is not None else None
-            except Exception:
-                dd = None
-
+            ff = to_float(f.attribute(idx_ff))
+            dd = to_float(f.attribute(idx_dd))
             if ff is None or dd is None:
                 continue
             if ff < 0:
                 continue
 
-            rec = {
-                "ff": float(ff),
-                "dd": float(dd % 360.0),
-            }
+            ff_list.append(ff)
+            dd_list.append(dd)
             if have_dt:
-                rec["date"] = dt
+                dt_list.append(f.attribute(idx_dt))  # raw value, parsed in bulk below
 
-            ts.append(rec)
+        ff_arr = np.asarray(ff_list, dtype=np.float64)
+        dd_arr = np.mod(np.asarray(dd_list, dtype=np.float64), 360.0)
+        dt64 = None
+        if have_dt:
+            # Datetime (optional): rows without a parseable timestamp are dropped
+            dt64 = self._parse_datetime_column(dt_list, feedback)
+            keep = ~np.isnat(dt64)
+            ff_arr, dd_arr, dt64 = ff_arr[keep], dd_arr[keep], dt64[keep]
+        del ff_list, dd_list, dt_list
 
-        if not ts:
+        if ff_arr.size == 0:
             raise QgsProcessingException(
                 "No valid (speed + direction [+ datetime]) rows after cleaning input table."
             )
 
-        # Sort (if we have dates, sort by them; otherwise sort by speed for determinism)
-        if have_dt:
-            ts.sort(key=lambda x: x["date"])
-        else:
-            ts.sort(key=lambda x: x["ff"])
-
         # ---- Speed-info (overall only) ----
-        from statistics import mean
-
-        all_vals = [r["ff"] for r in ts]
-        if not all_vals:
-            raise QgsProcessingException("No valid speed values found in the input table.")
-
+        # np.percentile default ("linear") = inclusive percentile as in _percentile_inc
+        p90, p95 = np.percentile(ff_arr, [90, 95]).tolist()
         overall_row = [
             "__ALL__",
-            len(all_vals),
-            float(min(all_vals)),
-            float(mean(all_vals)),
-            float(max(all_vals)),
-            WindFrequencyFromTable._percentile_inc(all_vals, 0.90),
-            WindFrequencyFromTable._percentile_inc(all_vals, 0.95),
+            int(ff_arr.size),
+            float(ff_arr.min()),
+            float(ff_arr.mean()),
+            float(ff_arr.max()),
+            p90,
+            p95,
         ]
         speed_rows = [overall_row]
 
@@ -738,37 +991,34 @@ class WindFrequencyFromTable(QgsProcessingAlgorithm):
                 raise QgsProcessingException(
                     "Auto-binning: step size must be > 0 or specify classes manually."
                 )
-            gmax = max((r["ff"] for r in ts), default=0.0)
-            top = math.ceil(gmax / autobin_width) * autobin_width
-            edges = [0.0]
-            x = 0.0
-            while x < top - 1e-12:
-                x = round(x + autobin_width, 6)
-                edges.append(x)
+            gmax = float(ff_arr.max())
+            n_steps = int(math.ceil(gmax / autobin_width))
+            top = n_steps * autobin_width
+            # k * step rounded once per edge (no accumulated rounding along the ramp)
+            edges = np.round(np.arange(n_steps + 1) * autobin_width, 6).tolist()
             feedback.pushInfo(
                 f"Auto-binning: step={autobin_width} m/s, edges 0..{top} → {edges} (+∞)"
             )
         if not math.isinf(edges[-1]):
             edges = edges + [float("inf")]
 
-        # ---- Annotate month/season if we have datetime ----
+        # ---- Group ids per sample if we have datetime (factorized once for all outputs) ----
         if have_dt:
-            for r in ts:
-                m = r["date"].month
-                r["month"] = m
-                r["season"] = (
-                    "DJF"
-                    if m in (12, 1, 2)
-                    else ("MAM" if m in (3, 4, 5) else ("JJA" if m in (6, 7, 8) else "SON"))
-                )
+            month_ids = (dt64.astype("datetime64[M]").astype(np.int64) % 12).astype(np.int8)  # 0 = Jan
+            season_ids = _SEASON_LUT[month_ids]
+            custom_mask = (
+                np.isin(month_ids, np.array(filter_months, dtype=np.int8) - 1) if filter_months else None
+            )
 
         results = {"OUT_DIR": out_dir, "SPEED_INFO_CSV": out_speed_info}
 
         # ---- 1) Total (entire dataset) ----
+        hist_all = None
         if want_all_long or want_all_matrix:
             feedback.pushInfo("Aggregate frequencies (total dataset) …")
-            long_all = self._freq_long_plain(ts, n_sect, edges, extra_dims=None)
+            hist_all = self._freq_counts(ff_arr, dd_arr, edges, n_sect)
             if want_all_long:
+                long_all = self._freq_long_from_counts(hist_all, edges, n_sect)
                 out_all_long = os.path.join(out_dir, f"{prefix}_frequency_total.csv")
                 header = ["sector", "vclass", "n", "pct"]
                 rows = [
@@ -778,19 +1028,19 @@ class WindFrequencyFromTable(QgsProcessingAlgorithm):
                 self._write_csv(out_all_long, header, rows)
                 results["CSV_ALL"] = out_all_long
             if want_all_matrix:
-                header, rows = self._freq_matrix_from_long_plain(
-                    long_all, extra_dims=[], value_col="n"
-                )
                 # header: ["vclass", sector1, sector2, ...]
                 out_all_mat = os.path.join(out_dir, f"{prefix}_matrix_total.csv")
-                self._write_csv(out_all_mat, header, rows)
+                self._write_matrix_csv(out_all_mat, hist_all, n_sect, edges)
                 results["CSV_ALL_MATRIX"] = out_all_mat
 
         # ---- 2) Monthly ----
         if have_dt and (want_mon_long or want_mon_matrix):
             feedback.pushInfo("Aggregate frequencies (monthly) …")
-            long_mon = self._freq_long_plain(ts, n_sect, edges, extra_dims=["month"])
+            hist_mon = self._freq_counts(
+                ff_arr, dd_arr, edges, n_sect, gid=month_ids, labels=range(1, 13)
+            )
             if want_mon_long:
+                long_mon = self._freq_long_from_counts(hist_mon, edges, n_sect, dim="month")
                 out_mon_long = os.path.join(out_dir, f"{prefix}_frequency_by_month.csv")
                 header = ["month", "sector", "vclass", "n", "pct"]
                 rows = [
@@ -800,18 +1050,18 @@ class WindFrequencyFromTable(QgsProcessingAlgorithm):
                 self._write_csv(out_mon_long, header, rows)
                 results["CSV_MONTH"] = out_mon_long
             if want_mon_matrix:
-                header, rows = self._freq_matrix_from_long_plain(
-                    long_mon, extra_dims=["month"], value_col="n"
-                )
                 out_mon_mat = os.path.join(out_dir, f"{prefix}_matrix_by_month.csv")
-                self._write_csv(out_mon_mat, header, rows)
+                self._write_matrix_csv(out_mon_mat, hist_mon, n_sect, edges, "month")
                 results["CSV_MONTH_MATRIX"] = out_mon_mat
 
         # ---- 3) Seasonal ----
         if have_dt and (want_sea_long or want_sea_matrix):
             feedback.pushInfo("Aggregate frequencies (seasonal) …")
-            long_sea = self._freq_long_plain(ts, n_sect, edges, extra_dims=["season"])
+            hist_sea = self._freq_counts(
+                ff_arr, dd_arr, edges, n_sect, gid=season_ids, labels=_SEASON_NAMES
+            )
             if want_sea_long:
+                long_sea = self._freq_long_from_counts(hist_sea, edges, n_sect, dim="season")
                 out_sea_long = os.path.join(out_dir, f"{prefix}_frequency_by_season.csv")
                 header = ["season", "sector", "vclass", "n", "pct"]
                 rows = [
@@ -821,29 +1071,24 @@ class WindFrequencyFromTable(QgsProcessingAlgorithm):
                 self._write_csv(out_sea_long, header, rows)
                 results["CSV_SEASON"] = out_sea_long
             if want_sea_matrix:
-                header, rows = self._freq_matrix_from_long_plain(
-                    long_sea, extra_dims=["season"], value_col="n"
-                )
                 out_sea_mat = os.path.join(out_dir, f"{prefix}_matrix_by_season.csv")
-                self._write_csv(out_sea_mat, header, rows)
+                self._write_matrix_csv(out_sea_mat, hist_sea, n_sect, edges, "season")
                 results["CSV_SEASON_MATRIX"] = out_sea_mat
 
         # ---- 4) Custom: filter months ----
         if have_dt and (want_cus_long or want_cus_matrix):
             if filter_months:
                 feedback.pushInfo(f"Custom output: filter months {filter_months} …")
-                ts_custom = [r for r in ts if r["month"] in filter_months]
-            else:
-                ts_custom = list(ts)
 
-            if not ts_custom:
+            if custom_mask is not None and not custom_mask.any():
                 feedback.pushInfo("Custom output: no data in filter – skip.")
             else:
-                long_cus = self._freq_long_plain(
-                    ts_custom,
-                    n_sect,
+                hist_cus = self._freq_counts(
+                    ff_arr,
+                    dd_arr,
                     edges,
-                    extra_dims=None,  # just one dataset
+                    n_sect,  # just one dataset
+                    mask=custom_mask,
                 )
 
                 mon_label = "all" if not filter_months else "_".join(
@@ -858,22 +1103,18 @@ class WindFrequencyFromTable(QgsProcessingAlgorithm):
                     header = ["sector", "vclass", "n", "pct"]
                     rows = [
                         [r["sector"], r["vclass"], r["n"], r["pct"]]
-                        for r in long_cus
+                        for r in self._freq_long_from_counts(hist_cus, edges, n_sect)
                     ]
                     self._write_csv(out_cus_long, header, rows)
                     results["CSV_CUSTOM"] = out_cus_long
 
                 if want_cus_matrix:
-                    header, rows = self._freq_matrix_from_long_plain(
-                        long_cus,
-                        extra_dims=[],  # only vclass + sectors
-                        value_col="n",
-                    )
                     out_cus_mat = os.path.join(
                         out_dir,
                         f"{prefix}_matrix_custom_m{mon_label}_FOR_WIND_STAT_TOOL.csv",
                     )
-                    self._write_csv(out_cus_mat, header, rows)
+                    # only vclass + sectors
+                    self._write_matrix_csv(out_cus_mat, hist_cus, n_sect, edges)
                     results["CSV_CUSTOM_MATRIX"] = out_cus_mat
 
         # ---- Optional wind-rose PNG ----
@@ -885,16 +1126,25 @@ class WindFrequencyFromTable(QgsProcessingAlgorithm):
             else:
                 period_str = None
                 if have_dt:
-                    d0 = min(r["date"] for r in ts)
-                    d1 = max(r["date"] for r in ts)
+                    d0 = dt64.min().astype(object)
+                    d1 = dt64.max().astype(object)
                     if d0.year == d1.year:
                         period_str = f"Year {d0:%Y}"
                     else:
                         period_str = f"Data from {d0:%Y} to {d1:%Y}"
 
+                # reuse the total histogram if it was binned with the plot classes
+                if hist_all is not None and tuple(edges) == _PLOT_EDGES:
+                    hist_plot = hist_all
+                else:
+                    hist_plot = self._freq_counts(ff_arr, dd_arr, _PLOT_EDGES, n_sect)
+                pct = np.round(100.0 * hist_plot[0][0] / ff_arr.size, 6)
+                width = 360.0 / n_sect
+                sec_upper = [self._sector_edge(k, width) for k in range(pct.shape[0])]
+
                 out_png = os.path.join(out_dir, f"{prefix}_windrose.png")
                 self._plot_windrose_png(
-                    ts, n_sect,
+                    pct, sec_upper, _PLOT_EDGES, float(ff_arr.mean()), n_sect,
                     out_png=out_png,
                     feedback=feedback,
                     period_str=period_str,
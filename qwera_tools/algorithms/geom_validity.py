@@ -1,5 +1,10 @@
 # -*- coding: utf-8 -*-
-from qgis.core import QgsApplication, QgsProcessing
+from qgis.core import (
+    QgsApplication, QgsProcessing, QgsProcessingUtils, QgsVectorLayer, QgsFeatureRequest,
+    QgsGeometry, QgsMemoryProviderUtils, QgsWkbTypes
+)
+import os
+from concurrent.futures import ThreadPoolExecutor
 import processing
 
 ## helper check validity
@@ -19,10 +24,92 @@ def _pick_alg(cache_key: str, preferred_ids):
             return a
     raise RuntimeError(f"Processing algorithm not available: {preferred_ids}")
 
+def _as_layer(vlayer, context):
+    if isinstance(vlayer, QgsVectorLayer):
+        return vlayer
+    lyr = QgsProcessingUtils.mapLayerFromString(str(vlayer), context)
+    return lyr if isinstance(lyr, QgsVectorLayer) else None
+
+def _first_invalid(vlayer, context, feedback):
+    """Fast GEOS pass over all geometries; returns the first invalid fid or None.
+
+    Returns -1 if the layer cannot be inspected directly (caller takes the full path).
+    """
+    lyr = _as_layer(vlayer, context)
+    if lyr is None:
+        return -1
+    for feat in lyr.getFeatures(QgsFeatureRequest().setNoAttributes()):
+        if feedback is not None and feedback.isCanceled():
+            return -1
+        if feat.hasGeometry() and not feat.geometry().isGeosValid():
+            return feat.id()
+    return None
+
+def _make_valid(geom, geom_type):
+    """GEOS MakeValid like native:fixgeometries: keeps only parts of the layer's geometry type."""
+    if geom is None or geom.isNull() or geom.isGeosValid():
+        return geom
+    fixed = geom.makeValid()
+    if fixed.isNull() or fixed.isEmpty():
+        return None
+    if fixed.type() != geom_type or \
+            QgsWkbTypes.flatType(fixed.wkbType()) == QgsWkbTypes.GeometryCollection:
+        # MakeValid may return a collection (e.g. polygon + dangling line)
+        parts = [g for g in fixed.asGeometryCollection() if g.type() == geom_type]
+        if not parts:
+            return None
+        fixed = QgsGeometry.collectGeometry(parts) if len(parts) > 1 else parts[0]
+    return fixed
+
+def _fix_layer(vlayer, context, feedback, name):
+    """Repairs invalid geometries on a thread pool into a memory layer (None -> use fixgeometries)."""
+    lyr = _as_layer(vlayer, context)
+    if lyr is None:
+        return None
+    # same output type as native:fixgeometries (lines/polygons promoted to multi)
+    out_type = QgsWkbTypes.promoteNonPointTypesToMulti(lyr.wkbType())
+    geom_type = QgsWkbTypes.geometryType(out_type)
+    multi = QgsWkbTypes.isMultiType(out_type)
+    feats = list(lyr.getFeatures())
+
+    def fix(feat):
+        if not feat.hasGeometry():
+            return None
+        geom = _make_valid(feat.geometry(), geom_type)
+        if geom is not None and multi and not geom.isMultipart():
+            geom.convertToMultiType()
+        return geom
+
+    # GEOS calls release the GIL, the features are only read by the workers
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as ex:
+        geoms = list(ex.map(fix, feats))
+    if feedback is not None and feedback.isCanceled():
+        return None
+
+    out = QgsMemoryProviderUtils.createMemoryLayer(f"{name}_fixed", lyr.fields(), out_type, lyr.crs())
+    keep, dropped = [], 0
+    for feat, geom in zip(feats, geoms):
+        if feat.hasGeometry():
+            if geom is None:
+                dropped += 1
+                continue
+            feat.setGeometry(geom)
+        keep.append(feat)
+    if not out.dataProvider().addFeatures(keep):
+        return None
+    out.updateExtents()
+    if dropped:
+        feedback.pushWarning(f"[{name}] {dropped} feature(s) could not be repaired and were dropped")
+    return out
+
 def check_and_fix_validity(vlayer, context, feedback, name):
+    # 0) Short-circuit: all geometries GEOS-valid -> nothing to check or repair
+    if _first_invalid(vlayer, context, feedback) is None:
+        feedback.pushInfo(f"[{name}] invalid features: 0")
+        return vlayer, None, None
+
     check_alg = _pick_alg("checkvalidity", ["qgis:checkvalidity", "native:checkvalidity"])
     fix_alg   = _pick_alg("fixgeometries", ["qgis:fixgeometries", "native:fixgeometries"])
-    stats_alg = _pick_alg("basicstats", ["qgis:basicstatisticsforfields", "native:basicstatisticsforfields"])
 
     # 1) Validate geometries (tolerate INPUT vs INPUT_LAYER)
     base_params = {
@@ -60,22 +147,12 @@ def check_and_fix_validity(vlayer, context, feedback, name):
 
     feedback.pushInfo(f"[{name}] invalid features: {invalid_count}")
 
-    # 3) Optional: summarize error types (try common field names)
-    if invalid_count and error_pts:
-        for fld in ("message", "MESSAGE", "error", "ERROR", "reason", "REASON"):
-            try:
-                stats = processing.run(
-                    stats_alg,
-                    {"INPUT_LAYER": error_pts, "FIELD_NAME": fld},
-                    context=context, feedback=feedback, is_child_algorithm=True
-                )["STATISTICS"]
-                feedback.pushInfo(f"[{name}] error summary ({fld}): {stats.get('UNIQUE_VALUES', 'n/a')} types")
-                break
-            except Exception:
-                continue
-
     # 4) Repair only if necessary
     if invalid_count > 0:
+        feedback.pushInfo(f"[{name}] fixing geometries (makeValid)…")
+        fixed = _fix_layer(vlayer, context, feedback, name)
+        if fixed is not None:
+            return fixed, invalid_lyr, error_pts
         feedback.pushInfo(f"[{name}] fixing geometries (fixgeometries)…")
         fixed = processing.run(
             fix_alg,
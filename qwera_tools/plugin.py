@@ -5,6 +5,7 @@ import os, sys
 
 from qgis.core import QgsApplication
 from .processing_provider import QWeraProcessingProvider
+from .algorithms.TOOL_1_LE_Calculator import expire_warp_cache
 #from qgis.PyQt.QtGui import QIcon
 #import os
 
@@ -14,6 +15,11 @@ class QWeraToolsPlugin:
         self.provider = None
 
     def initGui(self):
+        # alte Einträge des Warp-Caches von Tool 1 entfernen
+        try:
+            expire_warp_cache()
+        except Exception:
+            pass
         self.provider = QWeraProcessingProvider()
         QgsApplication.processingRegistry().addProvider(self.provider)
 